@@ -0,0 +1,98 @@
+"""Check that zero-valued criteria are honoured on every matching path.
+
+    python benchmarks/criteria.py
+
+Builds a few tracks (major and minor, with and without vocals) and applies
+criteria whose bounds are 0, such as `mode = 0` (minor keys only) and
+`max_instrumentalness = 0`, through CompiledCriteria.matches, the NumPy mask
+and FeatureStore.query. Exits non-zero if any path keeps a track it should
+drop, or drops one it should keep.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# name -> (mode, instrumentalness, valence)
+TRACKS = {
+    "major vocal": (1, 0.0, 0.6),
+    "major instrumental": (1, 0.8, 0.0),
+    "minor vocal": (0, 0.0, 0.0),
+    "minor instrumental": (0, 0.8, 0.4),
+}
+
+# criteria -> names that must match
+CASES = [
+    ({"mode": 0}, {"minor vocal", "minor instrumental"}),
+    ({"mode": 1}, {"major vocal", "major instrumental"}),
+    ({"max_instrumentalness": 0}, {"major vocal", "minor vocal"}),
+    ({"mode": 0, "max_valence": 0}, {"minor vocal"}),
+    ({"min_valence": 0}, set(TRACKS)),
+]
+
+
+def build_tracks():
+    from dj.data import Track, TrackAnalysis, _audio_features_from_values
+
+    track_analyses = []
+    for number, (name, (mode, instrumentalness, valence)) in enumerate(TRACKS.items()):
+        uri = f"spotify:track:tr{number:011d}"
+        analysis = _audio_features_from_values(
+            uri,
+            dict(
+                danceability=0.5,
+                energy=0.5,
+                key=0,
+                loudness=-8.0,
+                mode=mode,
+                speechiness=0.05,
+                acousticness=0.2,
+                instrumentalness=instrumentalness,
+                liveness=0.1,
+                valence=valence,
+                tempo=120.0,
+                duration_ms=200000,
+                time_signature=4,
+            ),
+        )
+        track_analyses.append(TrackAnalysis(Track(name, uri, False), analysis))
+    return track_analyses
+
+
+def main():
+    sys.path.insert(0, str(SRC))
+    from dj.data import Artist
+    from dj.feature_store import FeatureStore
+    from dj.matcher import CompiledCriteria
+
+    track_analyses = build_tracks()
+    analyses = [ta.analysis for ta in track_analyses]
+    store = FeatureStore(Path(tempfile.mkdtemp()) / "features.sqlite")
+    store.add(Artist(name="Artist", id="ar00000", genres=[]), track_analyses)
+
+    failures = []
+    for section, expected in CASES:
+        criteria = CompiledCriteria(section)
+        found = {
+            "matches": {
+                ta.track.name for ta in track_analyses if criteria.matches(ta.analysis)
+            },
+            "mask": {track_analyses[i].track.name for i in criteria.indices(analyses)},
+            "query": {
+                row.track_analysis.name for row in store.query(criteria, limit=None)
+            },
+        }
+        for path, names in found.items():
+            status = "ok" if names == expected else "FAIL"
+            print(f"{status:<4} {path:<7} {section}: {sorted(names)}")
+            if names != expected:
+                failures.append(f"{path} {section} matched {sorted(names)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
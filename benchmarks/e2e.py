@@ -0,0 +1,209 @@
+"""End-to-end CLI benchmarks against the local fake Spotify API.
+
+    python benchmarks/e2e.py [--sizes small medium] [--latency_ms 20]
+
+For every catalog size a fresh fake server is started and each entry point
+runs in a subprocess with an empty metadata cache. Reports wall time, API
+requests served and the child's peak RSS.
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from fake_spotify import DEFAULT_PLAYLIST, DEFAULT_USER, serve
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+SIZES = {
+    # artists, albums per artist, tracks per album
+    "small": (50, 5, 10),
+    "medium": (200, 20, 12),
+    "large": (500, 50, 15),
+}
+
+CRITERIA = """\
+[characteristics]
+min_valence = 0.3
+max_energy = 0.8
+min_tempo = 80
+max_tempo = 140
+"""
+
+
+def cases(workdir: Path):
+    seed = "spotify:artist:ar00000"
+    criteria = str(workdir / "criteria.toml")
+    return {
+        "information all_tracks": [
+            "dj.cli_information",
+            "artist",
+            "all_tracks",
+            "-a",
+            seed,
+            "-r",
+            "True",
+            "-i",
+            criteria,
+            "-o",
+            "bench_all_tracks",
+        ],
+        "information master": [
+            "dj.cli_information",
+            "artist",
+            "master",
+            "-a",
+            seed,
+            "-r",
+            "True",
+            "-i",
+            criteria,
+            "-o",
+            "bench_master",
+        ],
+        "create_from_csv": [
+            "dj.cli_create_from_csv",
+            "-i",
+            str(workdir / "artist_csvs" / "bench_master.csv"),
+            "-p",
+            "pl00000",
+            "-u",
+            "BENCH_USER",
+        ],
+        "recommend_and_inspect": [
+            "dj.cli_recommender",
+            "-p",
+            DEFAULT_PLAYLIST,
+            "-e",
+            "True",
+            "-u",
+            "BENCH_USER",
+            "-a",
+            "ar00001",
+            "ar00002",
+            "-l",
+            "100",
+            "-f",
+            "True",
+            "-i",
+            criteria,
+        ],
+    }
+
+
+def fetch_stats(base_url: str):
+    with urllib.request.urlopen(f"{base_url}/_stats") as response:
+        return json.load(response)
+
+
+def reset_stats(base_url: str):
+    request = urllib.request.Request(f"{base_url}/_reset", method="POST")
+    urllib.request.urlopen(request).close()
+
+
+def run_case(argv, env, cwd):
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", *argv],
+        env=env,
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    stderr = process.stderr.read().decode() if process.stderr else ""
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return elapsed, os.waitstatus_to_exitcode(status), usage.ru_maxrss * scale, stderr
+
+
+def rows_in(path: Path) -> int:
+    if not path.exists():
+        return 0
+    with open(path) as fh:
+        return sum(1 for _ in csv.DictReader(fh))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end CLI benchmark")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["small"])
+    parser.add_argument("--latency_ms", type=float, default=0)
+    parser.add_argument("--rate_limit", type=float, help="Server-side 429 ceiling")
+    parser.add_argument(
+        "--client_rate",
+        type=float,
+        default=1000,
+        help="DJ_RATE_LIMIT for the CLIs; the default keeps the client throttle"
+        " out of the measurement",
+    )
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    header = f"{'size':<8} {'case':<24} {'wall s':>8} {'requests':>9} {'peak MiB':>9}"
+    print(header)
+    for size in args.sizes:
+        artists, albums, tracks = SIZES[size]
+        server = serve(
+            artists,
+            albums,
+            tracks,
+            latency_ms=args.latency_ms,
+            rate_limit=args.rate_limit,
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            (workdir / "artist_csvs").mkdir()
+            (workdir / "criteria.toml").write_text(CRITERIA)
+            env = dict(
+                os.environ,
+                PYTHONPATH=str(SRC),
+                DJ_API_PREFIX=f"{server.base_url}/v1/",
+                DJ_CACHE_PATH=str(workdir / "cache.sqlite"),
+                DJ_FEATURE_STORE_PATH=str(workdir / "features.sqlite"),
+                DJ_DISCOGRAPHY_PATH=str(workdir / "discography.sqlite"),
+                BENCH_USER=DEFAULT_USER,
+                DJ_RATE_LIMIT=str(args.client_rate),
+            )
+            for name, argv in cases(workdir).items():
+                reset_stats(server.base_url)
+                elapsed, code, peak, stderr = run_case(argv, env, workdir)
+                stats = fetch_stats(server.base_url)
+                result = {
+                    "size": size,
+                    "case": name,
+                    "wall_seconds": round(elapsed, 3),
+                    "requests": stats["total"],
+                    "requests_by_endpoint": stats["requests"],
+                    "response_bytes": stats["bytes"],
+                    "peak_rss_bytes": peak,
+                    "exit_code": code,
+                }
+                results.append(result)
+                status = "" if code == 0 else f"  FAILED ({code})"
+                print(
+                    f"{size:<8} {name:<24} {elapsed:>8.2f} {stats['total']:>9}"
+                    f" {peak / 2**20:>9.1f}{status}"
+                )
+                if code:
+                    print(stderr.strip().splitlines()[-1] if stderr.strip() else "")
+            results[-1]["csv_rows"] = rows_in(
+                workdir / "artist_csvs" / "bench_master.csv"
+            )
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
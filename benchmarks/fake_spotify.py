@@ -0,0 +1,612 @@
+"""Local stand-in for the Spotify Web API.
+
+    python benchmarks/fake_spotify.py --artists 200 --albums 20 --tracks 12
+
+Serves a deterministic synthetic catalog (artists, albums, tracks, audio
+features, recommendations, playlists) with configurable latency, page size and
+rate limiting. Point the CLIs at it with:
+
+    DJ_API_PREFIX=http://127.0.0.1:8765/v1/
+
+Request counts per endpoint are served from GET /_stats; POST /_reset zeroes
+them. A server started with fail_status answers every API request with that
+status (e.g. 503) until the attribute is cleared.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+GENRES = [
+    "ambient",
+    "chill",
+    "deep-house",
+    "electronic",
+    "folk",
+    "hip-hop",
+    "indie",
+    "jazz",
+    "r-n-b",
+    "soul",
+]
+RELATED_PER_ARTIST = 20
+TOP_TRACKS = 10
+ID_DIGITS = {"ar": 5, "al": 8, "tr": 11}  # digits after the two-letter prefix
+DEFAULT_USER = "user0"
+DEFAULT_PLAYLIST = "Bench Playlist"
+
+
+def _rng(*parts) -> random.Random:
+    return random.Random(zlib.crc32(":".join(map(str, parts)).encode()))
+
+
+class Catalog:
+    def __init__(self, artists: int, albums: int, tracks: int):
+        self.artists = artists
+        self.albums = albums
+        self.tracks = tracks
+        self.playlists: Dict[str, Dict[str, Any]] = {}
+        self.user_playlists: Dict[str, List[str]] = {}
+        self.recommendation_calls = 0
+        self._lock = threading.Lock()
+        self.create_playlist(DEFAULT_USER, DEFAULT_PLAYLIST)
+
+    # ids: ar00012, al00012003, tr00012003007
+    @staticmethod
+    def artist_id(a: int) -> str:
+        return f"ar{a:05d}"
+
+    @staticmethod
+    def album_id(a: int, b: int) -> str:
+        return f"al{a:05d}{b:03d}"
+
+    @staticmethod
+    def track_id(a: int, b: int, t: int) -> str:
+        return f"tr{a:05d}{b:03d}{t:03d}"
+
+    @staticmethod
+    def parse(entity_id: str) -> Tuple[int, ...]:
+        digits = entity_id[2:]
+        return tuple(
+            int(digits[i:j]) for i, j in ((0, 5), (5, 8), (8, 11)) if digits[i:j]
+        )
+
+    def artist(self, a: int) -> Dict[str, Any]:
+        rng = _rng("artist", a)
+        artist_id = self.artist_id(a)
+        return {
+            "id": artist_id,
+            "name": f"Artist {a:05d}",
+            "uri": f"spotify:artist:{artist_id}",
+            "genres": rng.sample(GENRES, 2),
+            "type": "artist",
+        }
+
+    def simple_artist(self, a: int) -> Dict[str, Any]:
+        full = self.artist(a)
+        return {k: full[k] for k in ("id", "name", "uri", "type")}
+
+    def album(self, a: int, b: int) -> Dict[str, Any]:
+        album_id = self.album_id(a, b)
+        return {
+            "id": album_id,
+            "name": f"Album {a:05d}-{b:03d}",
+            "uri": f"spotify:album:{album_id}",
+            "type": "album",
+            "artists": [self.simple_artist(a)],
+        }
+
+    def track(self, a: int, b: int, t: int) -> Dict[str, Any]:
+        track_id = self.track_id(a, b, t)
+        return {
+            "id": track_id,
+            "name": f"Track {a:05d}-{b:03d}-{t:03d}",
+            "uri": f"spotify:track:{track_id}",
+            "explicit": _rng("explicit", track_id).random() < 0.2,
+            "type": "track",
+            "artists": [self.simple_artist(a)],
+            "album": {k: v for k, v in self.album(a, b).items() if k != "artists"},
+        }
+
+    def audio_features(self, track_id: str) -> Optional[Dict[str, Any]]:
+        if not self.exists(track_id, "tr"):
+            return None
+        rng = _rng("features", track_id)
+        return {
+            "danceability": round(rng.random(), 3),
+            "energy": round(rng.random(), 3),
+            "key": rng.randrange(12),
+            "loudness": round(rng.uniform(-30, 0), 3),
+            "mode": rng.randrange(2),
+            "speechiness": round(rng.random() * 0.5, 3),
+            "acousticness": round(rng.random(), 3),
+            "instrumentalness": round(rng.random(), 3),
+            "liveness": round(rng.random() * 0.6, 3),
+            "valence": round(rng.random(), 3),
+            "tempo": round(rng.uniform(60, 180), 3),
+            "type": "audio_features",
+            "id": track_id,
+            "uri": f"spotify:track:{track_id}",
+            "track_href": f"https://api.spotify.com/v1/tracks/{track_id}",
+            "analysis_url": f"https://api.spotify.com/v1/audio-analysis/{track_id}",
+            "duration_ms": rng.randrange(90_000, 420_000),
+            "time_signature": rng.choice([3, 4, 4, 4, 5]),
+        }
+
+    def exists(self, entity_id: str, prefix: str) -> bool:
+        # Well-formed for its kind (see ID_DIGITS) and inside the catalog
+        digits = entity_id[2:]
+        if entity_id[:2] != prefix or len(digits) != ID_DIGITS[prefix]:
+            return False
+        if not digits.isdigit():
+            return False
+        limits = (self.artists, self.albums, self.tracks)
+        return all(0 <= p < limit for p, limit in zip(self.parse(entity_id), limits))
+
+    def related(self, a: int) -> List[Dict[str, Any]]:
+        rng = _rng("related", a)
+        others = [i for i in range(self.artists) if i != a]
+        picked = rng.sample(others, min(RELATED_PER_ARTIST, len(others)))
+        return [self.artist(i) for i in picked]
+
+    def random_track(self, rng: random.Random, a: Optional[int] = None):
+        a = rng.randrange(self.artists) if a is None else a
+        return self.track(a, rng.randrange(self.albums), rng.randrange(self.tracks))
+
+    def recommendations(self, seeds: List[str], limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.recommendation_calls += 1
+            call = self.recommendation_calls
+        rng = _rng("recommendations", ",".join(sorted(seeds)), call)
+        return [self.random_track(rng) for _ in range(limit)]
+
+    def create_playlist(self, user: str, name: str) -> Dict[str, Any]:
+        with self._lock:
+            playlist_id = f"pl{len(self.playlists):05d}"
+            self.playlists[playlist_id] = {
+                "id": playlist_id,
+                "name": name,
+                "uri": f"spotify:playlist:{playlist_id}",
+                "owner": {"id": user},
+                "snapshot": 0,
+                "items": [],
+            }
+            self.user_playlists.setdefault(user, []).append(playlist_id)
+        return self.playlist_summary(playlist_id)
+
+    def playlist_summary(self, playlist_id: str) -> Dict[str, Any]:
+        p = self.playlists[playlist_id]
+        return {
+            "id": p["id"],
+            "name": p["name"],
+            "uri": p["uri"],
+            "owner": p["owner"],
+            "snapshot_id": f"snap{p['snapshot']}",
+            "tracks": {"total": len(p["items"])},
+        }
+
+    def track_by_uri(self, uri: str) -> Dict[str, Any]:
+        track_id = uri.split(":")[-1]
+        if not self.exists(track_id, "tr"):
+            raise KeyError(track_id)
+        return self.track(*self.parse(track_id))
+
+
+class RateLimiter:
+    def __init__(self, per_second: Optional[float], every_nth_429: Optional[int]):
+        self.per_second = per_second
+        self.every_nth_429 = every_nth_429
+        self._recent: deque = deque()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def check(self) -> Optional[int]:
+        # Seconds to put in Retry-After, or None to serve the request
+        with self._lock:
+            self._count += 1
+            if self.every_nth_429 and self._count % self.every_nth_429 == 0:
+                return 1
+            if not self.per_second:
+                return None
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.per_second:
+                return 1
+            self._recent.append(now)
+            return None
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        catalog: Catalog,
+        latency_ms: float = 0,
+        page_size: int = 50,
+        rate_limiter: Optional[RateLimiter] = None,
+        fail_status: Optional[int] = None,
+    ):
+        super().__init__(address, Handler)
+        self.fail_status = fail_status
+        self.catalog = catalog
+        self.latency_ms = latency_ms
+        self.page_size = page_size
+        self.rate_limiter = rate_limiter or RateLimiter(None, None)
+        self.stats: Counter = Counter()
+        self.bytes_sent = 0
+        self.stats_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats.clear()
+            self.bytes_sent = 0
+
+
+ROUTES = []
+
+
+def route(method: str, pattern: str):
+    def decorator(fn):
+        ROUTES.append((method, re.compile(f"^/v1/{pattern}/?$"), fn))
+        return fn
+
+    return decorator
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: FakeSpotifyServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+        with self.server.stats_lock:
+            self.server.bytes_sent += len(payload)
+
+    def _body(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _dispatch(self, method: str):
+        parsed = urlparse(self.path)
+        if parsed.path == "/_stats":
+            with self.server.stats_lock:
+                body = {
+                    "requests": dict(self.server.stats),
+                    "total": sum(self.server.stats.values()),
+                    "bytes": self.server.bytes_sent,
+                }
+            return self._send(200, body)
+        if parsed.path == "/_reset":
+            self.server.reset_stats()
+            return self._send(200, {})
+
+        for route_method, pattern, fn in ROUTES:
+            if route_method == method and (match := pattern.match(parsed.path)):
+                with self.server.stats_lock:
+                    self.server.stats[f"{method} {fn.__name__}"] += 1
+                if status := self.server.fail_status:
+                    return self._send(
+                        status, {"error": {"status": status, "message": "Outage"}}
+                    )
+                if retry_after := self.server.rate_limiter.check():
+                    return self._send(
+                        429,
+                        {
+                            "error": {
+                                "status": 429,
+                                "message": "API rate limit exceeded",
+                            }
+                        },
+                        {"Retry-After": str(retry_after)},
+                    )
+                if self.server.latency_ms:
+                    time.sleep(self.server.latency_ms / 1000)
+                query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                try:
+                    status, body = fn(self, *match.groups(), query=query)
+                except (KeyError, ValueError, IndexError):
+                    status, body = 404, {
+                        "error": {"status": 404, "message": "Not found"}
+                    }
+                return self._send(status, body)
+
+        self._send(404, {"error": {"status": 404, "message": "Unknown endpoint"}})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def page(self, items: List[Any], query: Dict[str, str], max_limit: int = 50):
+        limit = min(int(query.get("limit", 20)), max_limit, self.server.page_size)
+        offset = int(query.get("offset", 0))
+        path = urlparse(self.path).path
+        next_url = None
+        if offset + limit < len(items):
+            params = dict(query, offset=offset + limit, limit=limit)
+            next_url = f"{self.server.base_url}{path}?{urlencode(params)}"
+        return {
+            "href": f"{self.server.base_url}{self.path}",
+            "items": items[offset : offset + limit],
+            "limit": limit,
+            "offset": offset,
+            "next": next_url,
+            "previous": None,
+            "total": len(items),
+        }
+
+    @property
+    def catalog(self) -> Catalog:
+        return self.server.catalog
+
+
+def _check(catalog: Catalog, entity_id: str, prefix: str):
+    if not catalog.exists(entity_id, prefix):
+        raise KeyError(entity_id)
+    return catalog.parse(entity_id)
+
+
+@route("GET", r"artists/(\w+)")
+def artist(h: Handler, artist_id, query):
+    (a,) = _check(h.catalog, artist_id, "ar")
+    return 200, h.catalog.artist(a)
+
+
+@route("GET", r"artists")
+def artists(h: Handler, query):
+    ids = query["ids"].split(",")[:50]
+    return 200, {
+        "artists": [
+            h.catalog.artist(*h.catalog.parse(i)) if h.catalog.exists(i, "ar") else None
+            for i in ids
+        ]
+    }
+
+
+@route("GET", r"artists/(\w+)/albums")
+def artist_albums(h: Handler, artist_id, query):
+    (a,) = _check(h.catalog, artist_id, "ar")
+    albums = [h.catalog.album(a, b) for b in range(h.catalog.albums)]
+    return 200, h.page(albums, query)
+
+
+@route("GET", r"artists/(\w+)/related-artists")
+def related_artists(h: Handler, artist_id, query):
+    (a,) = _check(h.catalog, artist_id, "ar")
+    return 200, {"artists": h.catalog.related(a)}
+
+
+@route("GET", r"artists/(\w+)/top-tracks")
+def top_tracks(h: Handler, artist_id, query):
+    (a,) = _check(h.catalog, artist_id, "ar")
+    rng = _rng("top", a)
+    return 200, {"tracks": [h.catalog.random_track(rng, a) for _ in range(TOP_TRACKS)]}
+
+
+@route("GET", r"albums/(\w+)/tracks")
+def album_tracks(h: Handler, album_id, query):
+    a, b = _check(h.catalog, album_id, "al")
+    tracks = []
+    for t in range(h.catalog.tracks):
+        track = h.catalog.track(a, b, t)
+        del track["album"]
+        tracks.append(track)
+    return 200, h.page(tracks, query)
+
+
+@route("GET", r"tracks/(\w+)")
+def track(h: Handler, track_id, query):
+    return 200, h.catalog.track(*_check(h.catalog, track_id, "tr"))
+
+
+@route("GET", r"tracks")
+def tracks(h: Handler, query):
+    ids = query["ids"].split(",")[:50]
+    return 200, {
+        "tracks": [
+            h.catalog.track(*h.catalog.parse(i)) if h.catalog.exists(i, "tr") else None
+            for i in ids
+        ]
+    }
+
+
+@route("GET", r"audio-features")
+def audio_features(h: Handler, query):
+    ids = query["ids"].split(",")[:100]
+    return 200, {"audio_features": [h.catalog.audio_features(i) for i in ids]}
+
+
+@route("GET", r"recommendations/available-genre-seeds")
+def genre_seeds(h: Handler, query):
+    return 200, {"genres": GENRES}
+
+
+@route("GET", r"recommendations")
+def recommendations(h: Handler, query):
+    seeds = [
+        s
+        for key in ("seed_artists", "seed_tracks", "seed_genres")
+        for s in query.get(key, "").split(",")
+        if s
+    ]
+    if not seeds or len(seeds) > 5:
+        return 400, {"error": {"status": 400, "message": "Invalid seeds"}}
+    limit = min(int(query.get("limit", 20)), 100)
+    return 200, {"tracks": h.catalog.recommendations(seeds, limit), "seeds": []}
+
+
+@route("GET", r"search")
+def search(h: Handler, query):
+    type_ = query.get("type", "track").split(",")[0]
+    rng = _rng("search", query.get("q", ""))
+    count = min(int(query.get("limit", 10)), 50)
+    if type_ == "artist":
+        items = [
+            h.catalog.artist(rng.randrange(h.catalog.artists)) for _ in range(count)
+        ]
+    else:
+        items = [h.catalog.random_track(rng) for _ in range(count)]
+    return 200, {f"{type_}s": h.page(items, {"limit": str(count)})}
+
+
+@route("GET", r"playlists/(\w+)")
+def playlist(h: Handler, playlist_id, query):
+    summary = h.catalog.playlist_summary(playlist_id)
+    items = h.catalog.playlists[playlist_id]["items"]
+    summary["tracks"] = h.page(items, {"limit": "100"}, max_limit=100)
+    return 200, summary
+
+
+@route("GET", r"playlists/(\w+)/(?:tracks|items)")
+def playlist_tracks(h: Handler, playlist_id, query):
+    items = h.catalog.playlists[playlist_id]["items"]
+    return 200, h.page(items, query, max_limit=100)
+
+
+@route("POST", r"playlists/(\w+)/(?:tracks|items)")
+def playlist_add(h: Handler, playlist_id, query):
+    body = h._body()
+    # spotipy posts a bare URI list with position as a query parameter
+    uris = body if isinstance(body, list) else body["uris"]
+    position = query.get("position")
+    if isinstance(body, dict) and body.get("position") is not None:
+        position = body["position"]
+    if len(uris) > 100:
+        return 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+    p = h.catalog.playlists[playlist_id]
+    new_items = [{"track": h.catalog.track_by_uri(u)} for u in uris]
+    if position is None:
+        p["items"].extend(new_items)
+    else:
+        p["items"][int(position) : int(position)] = new_items
+    p["snapshot"] += 1
+    return 201, {"snapshot_id": f"snap{p['snapshot']}"}
+
+
+@route("PUT", r"playlists/(\w+)/(?:tracks|items)")
+def playlist_replace_or_reorder(h: Handler, playlist_id, query):
+    body = h._body()
+    p = h.catalog.playlists[playlist_id]
+    if "uris" in body:
+        p["items"] = [{"track": h.catalog.track_by_uri(u)} for u in body["uris"]]
+    else:
+        start, length = body["range_start"], body.get("range_length", 1)
+        moved = p["items"][start : start + length]
+        before = body["insert_before"]
+        rest = p["items"][:start] + p["items"][start + length :]
+        if before > start:
+            before -= length
+        p["items"] = rest[:before] + moved + rest[before:]
+    p["snapshot"] += 1
+    return 200, {"snapshot_id": f"snap{p['snapshot']}"}
+
+
+@route("GET", r"users/(\w+)/playlists")
+def user_playlists(h: Handler, user, query):
+    ids = h.catalog.user_playlists.get(user, [])
+    return 200, h.page([h.catalog.playlist_summary(i) for i in ids], query)
+
+
+@route("POST", r"users/(\w+)/playlists")
+def create_playlist(h: Handler, user, query):
+    return 201, h.catalog.create_playlist(user, h._body()["name"])
+
+
+@route("GET", r"me/tracks")
+def saved_tracks(h: Handler, query):
+    rng = _rng("saved")
+    items = [{"track": h.catalog.random_track(rng)} for _ in range(120)]
+    return 200, h.page(items, query)
+
+
+def serve(
+    artists: int = 200,
+    albums: int = 20,
+    tracks: int = 12,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency_ms: float = 0,
+    page_size: int = 50,
+    rate_limit: Optional[float] = None,
+    every_nth_429: Optional[int] = None,
+    fail_status: Optional[int] = None,
+) -> FakeSpotifyServer:
+    # Starts the server on a daemon thread and returns it; port 0 picks a free one
+    server = FakeSpotifyServer(
+        (host, port),
+        Catalog(artists, albums, tracks),
+        latency_ms=latency_ms,
+        page_size=page_size,
+        rate_limiter=RateLimiter(rate_limit, every_nth_429),
+        fail_status=fail_status,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Spotify Web API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--artists", type=int, default=200)
+    parser.add_argument("--albums", type=int, default=20, help="Albums per artist")
+    parser.add_argument("--tracks", type=int, default=12, help="Tracks per album")
+    parser.add_argument("--latency_ms", type=float, default=0)
+    parser.add_argument("--page_size", type=int, default=50, help="Max page size")
+    parser.add_argument("--rate_limit", type=float, help="Requests/second before 429")
+    parser.add_argument("--every_nth_429", type=int, help="Answer every Nth with 429")
+    parser.add_argument("--fail_status", type=int, help="Answer everything with this")
+    args = parser.parse_args()
+
+    server = serve(
+        args.artists,
+        args.albums,
+        args.tracks,
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        page_size=args.page_size,
+        rate_limit=args.rate_limit,
+        every_nth_429=args.every_nth_429,
+        fail_status=args.fail_status,
+    )
+    print(f"Serving fake Spotify API at {server.base_url}/v1/")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
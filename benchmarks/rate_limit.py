@@ -0,0 +1,94 @@
+"""Check that scripted 429s reach the request scheduler, and outages don't.
+
+    python benchmarks/rate_limit.py [-n CALLS] [--every_nth_429 2]
+
+Starts the fake API answering every Nth request with `429 Retry-After: 1` and
+makes CALLS lookups through `dj.wrapper.connection.spotify`. Each 429 must be
+retried by the scheduler, not by urllib3, after it halves its token bucket
+rate, and counted in the metrics' `retries`. Then the fake answers everything
+with 503: that must reach the caller as a 503 after urllib3's own retries,
+without touching the bucket or the retry count. Exits non-zero if any of that
+does not hold.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_spotify import serve
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scripted 429 check")
+    parser.add_argument("-n", "--calls", type=int, default=3)
+    parser.add_argument("--every_nth_429", type=int, default=2)
+    args = parser.parse_args()
+
+    server = serve(5, 1, 1, every_nth_429=args.every_nth_429)
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        DJ_API_PREFIX=f"{server.base_url}/v1/",
+        DJ_CACHE_PATH=str(Path(tmp) / "cache.sqlite"),
+        DJ_RATE_LIMIT="1000",
+    )
+    sys.path.insert(0, str(SRC))
+    from dj.wrapper.connection import get_spotify
+    from dj.wrapper.metrics import metrics
+
+    client = get_spotify()
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        client.artist("ar00000")
+    elapsed = time.perf_counter() - start
+
+    hits = sum(server.stats.values())
+    rejected = hits - args.calls
+    bucket = client.scheduler.bucket
+    stats = metrics.snapshot()["endpoints"]["artist"]
+    print(f"{args.calls} calls, {hits} requests served in {elapsed:.2f}s")
+    print(f"token bucket rate {bucket.rate:.1f}/s (ceiling {bucket.max_rate:.1f}/s)")
+    print(
+        f"metrics: {stats['retries']} retries,"
+        f" mean latency {stats['latency_seconds']['mean'] * 1000:.1f} ms"
+    )
+
+    # A persistent 5xx is an outage, not rate limiting
+    rate_before, retries_before = bucket.rate, stats["retries"]
+    server.reset_stats()
+    server.fail_status = 503
+    try:
+        client.artist("ar00000")
+        outage_status = None
+    except Exception as e:  # spotipy.SpotifyException
+        outage_status = getattr(e, "http_status", None)
+    server.fail_status = None
+    retries_after = metrics.snapshot()["endpoints"]["artist"]["retries"]
+    print(
+        f"503 outage: {sum(server.stats.values())} requests served,"
+        f" caller saw {outage_status}"
+    )
+
+    failures = []
+    if outage_status != 503:
+        failures.append(f"a 503 outage reached the caller as {outage_status}")
+    if bucket.rate != rate_before or retries_after != retries_before:
+        failures.append("the scheduler treated a 503 outage as rate limiting")
+    if rejected < 1:
+        failures.append("the fake API never answered 429")
+    if rejected and bucket.rate >= bucket.max_rate:
+        failures.append("the scheduler never slowed down after a 429")
+    if stats["retries"] != rejected:
+        failures.append(f"metrics count {stats['retries']} retries, not {rejected}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    server.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
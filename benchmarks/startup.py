@@ -0,0 +1,62 @@
+"""Cold-start timings for the console entry points.
+
+    python benchmarks/startup.py [-n RUNS]
+
+Each case runs in a fresh interpreter. `-h` cases never touch the network;
+`genre list` needs Spotify credentials (or DJ_API_PREFIX pointing at a local
+server) and is reported as failed otherwise.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+CASES = {
+    "information -h": ["dj.cli_information", "-h"],
+    "information genre list": ["dj.cli_information", "genre", "list"],
+    "create_from_csv -h": ["dj.cli_create_from_csv", "-h"],
+    "playlist_create -h": ["dj.cli_create_playlist_directly", "-h"],
+    "recommend_and_inspect -h": ["dj.cli_recommender", "-h"],
+}
+
+
+def time_case(argv, runs):
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-m", *argv],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append(time.perf_counter() - start)
+        if result.returncode:
+            return None
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entry point startup benchmark")
+    parser.add_argument("-n", "--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'case':<28} {'median ms':>10} {'min ms':>10}")
+    for name, argv in CASES.items():
+        timings = time_case(argv, args.runs)
+        if timings is None:
+            print(f"{name:<28} {'failed':>10}")
+            continue
+        median = statistics.median(timings) * 1000
+        print(f"{name:<28} {median:>10.1f} {min(timings) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
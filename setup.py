@@ -1,8 +1,11 @@
 from setuptools import find_packages, setup
 
 requirements = [
+    "numpy",
     "python-dotenv",
+    "scipy",
     "spotipy",
+    "toml",
 ]
 
 setup(
@@ -13,6 +16,7 @@ setup(
     author="Michelle Senar Dressler",
     license="MIT",
     install_requires=requirements,
+    extras_require={"aio": ["aiohttp"]},
     packages=find_packages("src"),
     package_dir={"": "src"},
     entry_points={
@@ -20,7 +24,8 @@ setup(
             "information = dj.cli_information:main",
             "create_from_csv = dj.cli_create_from_csv:main",
             "playlist_create = dj.cli_create_playlist_directly:main",
-            "recommend_and_inspect = dj.cli_recommender:main"
+            "recommend_and_inspect = dj.cli_recommender:main",
+            "feature_query = dj.cli_feature_store:main",
         ],
     },
 )
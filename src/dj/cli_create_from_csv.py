@@ -1,8 +1,10 @@
 import argparse
+import atexit
 import sys
 
 from .log_setup import get_logger
 from dj.wrapper.playlist import add_to_playlist_from_csv
+from dj.wrapper.metrics import metrics
 
 logger = get_logger(__name__)
 
@@ -23,6 +25,11 @@ def parse_args(arguments):
         help="firstnamelastname (all lowercase; no spaces)",
         required=True,
     )
+    parser.add_argument(
+        "--metrics_out",
+        "--metrics-out",
+        help="Write per-endpoint API metrics (.json, or .prom/.txt for Prometheus)",
+    )
 
     return parser.parse_args()
 
@@ -31,6 +38,9 @@ def main():
     arguments = sys.argv[-1]
     parsed_args = parse_args(arguments)
 
+    if parsed_args.metrics_out:
+        atexit.register(metrics.write, parsed_args.metrics_out)
+
     add_to_playlist_from_csv(
         parsed_args.username, parsed_args.playlist_id, parsed_args.input_csv_file
     )
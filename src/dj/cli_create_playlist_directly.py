@@ -1,8 +1,10 @@
 import argparse
+import atexit
 import sys
 
 from .log_setup import get_logger
 from dj.wrapper.playlist import create_new_playlist, add_to_existing_playlist
+from dj.wrapper.metrics import metrics
 
 logger = get_logger(__name__)
 
@@ -38,6 +40,11 @@ def parse_args(arguments):
         nargs="+",
         required=False,
     )
+    parser.add_argument(
+        "--metrics_out",
+        "--metrics-out",
+        help="Write per-endpoint API metrics (.json, or .prom/.txt for Prometheus)",
+    )
 
     return parser.parse_args()
 
@@ -46,6 +53,9 @@ def main():
     arguments = sys.argv[-1]
     parsed_args = parse_args(arguments)
 
+    if parsed_args.metrics_out:
+        atexit.register(metrics.write, parsed_args.metrics_out)
+
     if parsed_args.existing:
         add_to_existing_playlist(
             parsed_args.username,
@@ -0,0 +1,267 @@
+import argparse
+import atexit
+import os
+import sys
+import time
+
+from .feature_store import feature_store
+from .log_setup import get_logger
+from .output import AnalysisCsvWriter, output_csv_path
+from dj.wrapper.metrics import metrics
+from dj.wrapper.util import id_from_uri
+
+logger = get_logger(__name__)
+
+
+def parse_args(arguments):
+    parser = argparse.ArgumentParser(description="Query the local feature store")
+    parser.add_argument(
+        "--metrics_out",
+        "--metrics-out",
+        help="Write per-endpoint API metrics (.json, or .prom/.txt for Prometheus)",
+    )
+    subparsers = parser.add_subparsers(required=True, dest="command")
+
+    query_parser = subparsers.add_parser(
+        "query", help="Tracks matching a criteria TOML file"
+    )
+    query_parser.add_argument(
+        "-i",
+        "--input_toml_file",
+        help="TOML file with a [characteristics] table",
+        required=True,
+    )
+    query_parser.add_argument("-E", "--allow_explicit", action="store_true")
+    query_parser.add_argument(
+        "-l", "--limit", type=int, help="Return at most this many tracks"
+    )
+    query_parser.add_argument(
+        "-o",
+        "--output_csv_file",
+        help="Append results to artist_csvs/<name>.csv",
+        required=False,
+    )
+    query_parser.add_argument(
+        "-p",
+        "--playlist_name",
+        help="Add results to this existing playlist",
+        required=False,
+    )
+    query_parser.add_argument(
+        "-u",
+        "--username",
+        help="firstnamelastname (all lowercase; no spaces); needed with -p",
+        required=False,
+    )
+    query_parser.set_defaults(func=query)
+
+    ingest_parser = subparsers.add_parser(
+        "ingest", help="Load existing analysis CSVs into the store"
+    )
+    ingest_parser.add_argument("csv_files", nargs="+")
+    ingest_parser.set_defaults(func=ingest)
+
+    similar_parser = subparsers.add_parser(
+        "similar", help="Nearest neighbours of seed tracks by audio features"
+    )
+    similar_parser.add_argument(
+        "-t",
+        "--track_uris",
+        help="Seed track URI(s)",
+        nargs="+",
+        required=False,
+    )
+    similar_parser.add_argument(
+        "-f",
+        "--track_file",
+        help="File with one seed track URI per line",
+        required=False,
+    )
+    similar_parser.add_argument(
+        "-n",
+        "--neighbours",
+        type=int,
+        default=10,
+        help="Tracks to return per seed (default: 10)",
+    )
+    similar_parser.add_argument(
+        "-W",
+        "--weights",
+        nargs="+",
+        metavar="FEATURE=WEIGHT",
+        help="e.g. energy=2 tempo=0.5; unlisted features weigh 1, 0 ignores one",
+    )
+    similar_parser.add_argument("-E", "--allow_explicit", action="store_true")
+    similar_parser.add_argument(
+        "-o",
+        "--output_csv_file",
+        help="Append all neighbours to artist_csvs/<name>.csv",
+        required=False,
+    )
+    similar_parser.add_argument(
+        "-p",
+        "--playlist_name",
+        help="Add all neighbours to this existing playlist",
+        required=False,
+    )
+    similar_parser.add_argument(
+        "-u",
+        "--username",
+        help="firstnamelastname (all lowercase; no spaces); needed with -p",
+        required=False,
+    )
+    similar_parser.set_defaults(func=similar)
+
+    return parser.parse_args()
+
+
+def write_results(args, results):
+    # results: TrackAnalysisArtist rows from the store
+    if args.playlist_name and not args.username:
+        raise RuntimeError("--playlist_name needs --username")
+
+    if args.output_csv_file:
+        with AnalysisCsvWriter(output_csv_path(args.output_csv_file)) as writer:
+            for taa in results:
+                track_analysis = taa.track_analysis
+                writer.write(track_analysis.track, taa.artist, track_analysis.analysis)
+
+    if args.playlist_name:
+        from dj.wrapper.playlist import (
+            add_new_tracks_to_playlist,
+            get_user_playlist_id_from_playlist_name,
+        )
+
+        playlist_id = get_user_playlist_id_from_playlist_name(
+            os.getenv(args.username), args.playlist_name
+        )
+        added = add_new_tracks_to_playlist(
+            playlist_id,
+            (
+                (
+                    taa.track_analysis.track.uri,
+                    taa.track_analysis.track.name,
+                    taa.artist.name,
+                )
+                for taa in results
+            ),
+        )
+        logger.info("Added %d tracks to '%s'", added, args.playlist_name)
+
+
+def query(args):
+    from . import matcher  # NumPy/TOML; only needed to compile the criteria
+
+    criteria = matcher.CompiledCriteria.from_toml(args.input_toml_file)
+    start = time.perf_counter()
+    results = feature_store.query(
+        criteria, allow_explicit=args.allow_explicit, limit=args.limit
+    )
+    logger.info(
+        "%d tracks match (%.1f ms)", len(results), (time.perf_counter() - start) * 1e3
+    )
+
+    write_results(args, results)
+
+    if not (args.output_csv_file or args.playlist_name):
+        for taa in results:
+            print(
+                f"{taa.track_analysis.track.uri}\t{taa.track_analysis.track.name}"
+                f"\t{taa.artist.name}"
+            )
+
+
+def seed_track_uris(args):
+    uris = list(args.track_uris or [])
+    if args.track_file:
+        with open(args.track_file) as fh:
+            uris += [line.strip() for line in fh if line.strip()]
+    if not uris:
+        raise RuntimeError("Give seed tracks with --track_uris or --track_file")
+    # The store keys tracks by full URI
+    return [
+        u if u.startswith("spotify:") else f"spotify:track:{id_from_uri(u)}"
+        for u in uris
+    ]
+
+
+def similar(args):
+    # NumPy/SciPy; only needed to build the index
+    from .similarity import SIMILARITY_FEATURES, SimilarityIndex, parse_weights
+
+    if args.neighbours < 1:
+        raise RuntimeError("--neighbours must be at least 1")
+    seeds = seed_track_uris(args)
+    index = SimilarityIndex.from_store(
+        feature_store,
+        parse_weights(args.weights),
+        allow_explicit=args.allow_explicit,
+    )
+
+    # Seeds outside the local catalog get their features from the API, batched
+    known = [uri for uri in seeds if uri in index]
+    unknown = [uri for uri in seeds if uri not in index]
+    start = time.perf_counter()
+    neighbours = dict(zip(known, index.query(known, k=args.neighbours)))
+    logger.info(
+        "%d seeds searched (%.2f ms)", len(known), (time.perf_counter() - start) * 1e3
+    )
+    if unknown:
+        import dj.wrapper.track
+
+        raw_tracks = dj.wrapper.track.get_tracks_by_uris(unknown)
+        analyses = dj.wrapper.track.build_track_analyses(
+            [dj.wrapper.track.build_track(t) for t in raw_tracks if t]
+        )
+        found = [ta for ta in analyses if ta]
+        rows = [[getattr(ta.analysis, f) for f in SIMILARITY_FEATURES] for ta in found]
+        neighbours.update(
+            zip(
+                (ta.track.uri for ta in found),
+                index.query_features(rows, k=args.neighbours),
+            )
+        )
+
+    details = feature_store.get_many(
+        uri for results in neighbours.values() for uri, _ in results
+    )
+
+    results = []
+    for seed in seeds:
+        if seed not in neighbours:
+            logger.warning("No audio features for seed %s", seed)
+            continue
+        if not (args.output_csv_file or args.playlist_name):
+            print(f"# {seed}")
+        for uri, distance in neighbours[seed]:
+            taa = details[uri]
+            results.append(taa)
+            if not (args.output_csv_file or args.playlist_name):
+                print(
+                    f"{uri}\t{distance:.4f}\t{taa.track_analysis.track.name}"
+                    f"\t{taa.artist.name}"
+                )
+
+    write_results(args, results)
+
+
+def ingest(args):
+    for filename in args.csv_files:
+        count = feature_store.ingest_csv(filename)
+        logger.info("Read %d rows from %s", count, filename)
+    feature_store.optimize()
+    logger.info("Feature store holds %d tracks", len(feature_store))
+
+
+def main():
+    arguments = sys.argv[-1]
+    parsed_args = parse_args(arguments)
+
+    if parsed_args.metrics_out:
+        atexit.register(metrics.write, parsed_args.metrics_out)
+
+    parsed_args.func(parsed_args)
+
+
+if __name__ == "__main__":
+    main()
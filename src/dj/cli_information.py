@@ -1,20 +1,25 @@
 import argparse
-import csv
+import atexit
+import collections
 import sys
-import toml
-from pathlib import Path
 
 import dj.wrapper.artist
+import dj.wrapper.crawler
 import dj.wrapper.genre
 import dj.wrapper.playlist
 import dj.wrapper.track
+import dj.wrapper.transport
 import dj.wrapper.util
-from . import matcher
-from .logging import log_track_characteristics, KEY_INTEGER_TO_NAME_MAP, MODE_MAP
+from dj.wrapper.cache import cache
+from dj.wrapper.metrics import metrics
+from .feature_store import feature_store
+from .pipeline import buffered, chunked
+from .logging import log_track_characteristics
+from .output import AnalysisCsvWriter, output_csv_path
 from .log_setup import get_logger
 
-
 ARTIST_INFO_BY_NAME = "by_name"
+RECOMMEND_CHUNK_SIZE = 50
 
 
 logger = get_logger(__name__)
@@ -23,6 +28,21 @@ logger = get_logger(__name__)
 def parse_args(arguments):
     parser = argparse.ArgumentParser(description="Spotify Track Analysis")
     parser.add_argument("-e", "--allow_explicit", default=False)
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Bypass the local metadata cache, and don't record to the feature store",
+    )
+    parser.add_argument(
+        "--purge_cache",
+        action="store_true",
+        help="Empty the local metadata cache before running",
+    )
+    parser.add_argument(
+        "--metrics_out",
+        "--metrics-out",
+        help="Write per-endpoint API metrics (.json, or .prom/.txt for Prometheus)",
+    )
     subparsers = parser.add_subparsers()
 
     artist_parser = subparsers.add_parser("artist")
@@ -75,6 +95,31 @@ def parse_args(arguments):
         help="Limit search results to first N albums",
         required=False,
     )
+    artist_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=dj.wrapper.track.DEFAULT_WORKERS,
+        help="Number of albums (or related artists) to fetch concurrently",
+    )
+    artist_parser.add_argument(
+        "-d",
+        "--depth",
+        type=int,
+        default=dj.wrapper.crawler.DEFAULT_DEPTH,
+        help="master: how many hops of related artists to crawl",
+    )
+    artist_parser.add_argument(
+        "-j",
+        "--journal",
+        help="master: crawl journal file; rerun with the same file to resume",
+        required=False,
+    )
+    artist_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch albums not already in the local discography store",
+    )
     artist_parser.set_defaults(func=artist_information)
 
     track_parser = subparsers.add_parser("track")
@@ -90,6 +135,12 @@ def parse_args(arguments):
         help="Spotify Track URI",
         required=False,
     )
+    track_parser.add_argument(
+        "-f",
+        "--track_file",
+        help="File with one track URI, URL or name per line; resolved in bulk",
+        required=False,
+    )
     track_parser.set_defaults(func=show_track_info)
 
     genre_parser = subparsers.add_parser("genre")
@@ -146,6 +197,12 @@ def show_genre_info(args):
 
 
 def show_track_info(args):
+    if args.track_file:
+        if args.track_name or args.track_uri:
+            raise RuntimeError("Track Info from a file, or by URI or Name. Not both")
+        show_track_file_info(args.track_file)
+        return
+
     if args.track_name and not args.track_uri:
         track = dj.wrapper.util.search(args.track_name, "track")
     elif args.track_uri and not args.track_name:
@@ -160,6 +217,34 @@ def show_track_info(args):
     log_track_characteristics(artist, track_analysis)
 
 
+def show_track_file_info(track_file):
+    with open(track_file) as fh:
+        entries = [line.strip() for line in fh if line.strip()]
+
+    # URIs go 50 to a request; names can only be searched one at a time
+    uris = [e for e in entries if dj.wrapper.util.is_spotify_reference(e, "track")]
+    by_uri = dict(zip(uris, dj.wrapper.track.get_tracks_by_uris(uris)))
+    raw_tracks = []
+    for entry in entries:
+        if entry in by_uri:
+            raw_track = by_uri[entry]
+        else:
+            raw_track = dj.wrapper.util.search(entry, "track")
+        if raw_track:
+            raw_tracks.append(raw_track)
+        else:
+            logger.warning("No track found for '%s'", entry)
+
+    artists = dj.wrapper.artist.build_artists(
+        [t["artists"][0]["uri"] for t in raw_tracks]
+    )
+    tracks = [dj.wrapper.track.build_track(t) for t in raw_tracks]
+    track_analyses = dj.wrapper.track.build_track_analyses(tracks)
+    for artist, track_analysis in zip(artists, track_analyses):
+        if artist and track_analysis:
+            log_track_characteristics(artist, track_analysis)
+
+
 def show_top_tracks_per_artist(args):
     dj.wrapper.artist.get_top_tracks_per_artist(args.artist_uri, args.allow_explicit)
 
@@ -180,32 +265,42 @@ def get_artist_uri(args):
 
 
 def artist_information(args):
+    from . import matcher  # NumPy; only the artist subcommand needs it
+
+    # Crawl and track fetch overlap in master mode, each with its own workers
+    dj.wrapper.transport.ensure_pool_size(
+        args.workers * (2 if args.mode == "master" else 1)
+    )
     artist_uri = get_artist_uri(args)
     artist = dj.wrapper.artist.build_artist(artist_uri)
 
     if args.mode == "master":
-        logger.info("Write results to: %s", f"artist_csvs/{args.output_csv_file}.csv")
-        related = [
-            dj.wrapper.artist.build_artist(r["uri"])
-            for r in dj.wrapper.artist.get_related_artists(artist.id)
-        ]
-
-        all_artists = [artist] + related
-        count = 0
-        for artist in all_artists:
-            count += 1
+        logger.info("Write results to: %s", output_csv_path(args.output_csv_file))
+        crawler = dj.wrapper.crawler.RelatedArtistCrawler(
+            journal=args.journal, workers=args.workers
+        )
+        if args.recommend:
+            criteria = matcher.CompiledCriteria.from_toml(args.input_toml_file)
+        # crawler -> track fetcher -> matcher/CSV writer, each stage on its own
+        # thread with a bounded queue in between
+        for count, artist in enumerate(
+            buffered(crawler.crawl(artist, depth=args.depth)), start=1
+        ):
             if True or "chillhop" in artist.genres:
-                logger.info(
-                    "Gathering results for %d out of %d related artists.",
-                    count,
-                    len(all_artists),
-                )
-                track_analyses = dj.wrapper.track.get_all_tracks(
-                    artist, limit=args.limit
+                logger.info("Gathering results for artist %d (%s).", count, artist.name)
+                track_analyses = feature_store.record(
+                    artist,
+                    buffered(
+                        dj.wrapper.track.iter_all_tracks(
+                            artist,
+                            limit=args.limit,
+                            workers=args.workers,
+                            incremental=args.incremental,
+                        )
+                    ),
                 )
 
                 if args.recommend:
-                    criteria = toml.load(args.input_toml_file)["characteristics"]
                     track_recommender(
                         artist,
                         criteria,
@@ -213,12 +308,25 @@ def artist_information(args):
                         output_file_name=args.output_csv_file,
                         allow_explicit=args.allow_explicit,
                     )
+                else:
+                    collections.deque(track_analyses, maxlen=0)
+                crawler.mark_done(artist)
 
     if args.mode == "all_tracks":
-        track_analyses = dj.wrapper.track.get_all_tracks(artist, limit=args.limit)
+        track_analyses = feature_store.record(
+            artist,
+            buffered(
+                dj.wrapper.track.iter_all_tracks(
+                    artist,
+                    limit=args.limit,
+                    workers=args.workers,
+                    incremental=args.incremental,
+                )
+            ),
+        )
 
         if args.recommend:
-            criteria = toml.load(args.input_toml_file)["characteristics"]
+            criteria = matcher.CompiledCriteria.from_toml(args.input_toml_file)
             track_recommender(
                 artist,
                 criteria,
@@ -226,6 +334,8 @@ def artist_information(args):
                 output_file_name=args.output_csv_file,
                 allow_explicit=args.allow_explicit,
             )
+        else:
+            collections.deque(track_analyses, maxlen=0)
 
     elif args.mode == "info":
         print(artist)
@@ -245,82 +355,49 @@ def artist_information(args):
 def track_recommender(
     artist, criteria, track_analyses, output_file_name=None, allow_explicit=False
 ):
+    from . import matcher
+
     if output_file_name:
-        filename = f"artist_csvs/{output_file_name}.csv"
+        filename = output_csv_path(output_file_name)
     else:
-        filename = f"artist_csvs/{artist.name}.csv"
+        filename = output_csv_path(artist.name)
         matcher.log_output_csv(artist)
 
-    if Path(filename).exists():
-        existing = True
-    else:
-        existing = False
-
-    already_seen = []
-
-    with open(filename, "a") as fh:
-        fieldnames = [
-            "track_uri",
-            "track_name",
-            "artist_name",
-            "valence",
-            "energy",
-            "speechiness",
-            "bpm",
-            "duration_ms",
-            "instrumentalness",
-            "acousticness",
-            "danceability",
-            "key",
-            "mode",
-            "liveness",
-            "loudness",
-            "speechiness",
-            "time_signature",
-        ]
-        writer = csv.DictWriter(fh, fieldnames=fieldnames)
-
-        if not existing:
-            writer.writeheader()
-
-        for track_analysis in track_analyses:
-            track = track_analysis.track
-            if analysis := track_analysis.analysis:
-                if matcher.allowable_track(
-                    track, allow_explicit=allow_explicit
-                ) and matcher.acceptable_track(track, analysis, criteria):
-                    songname = f"{track.name}__{artist.name}"
-                    if songname not in already_seen:
-                        writer.writerow(
-                            {
-                                fieldnames[0]: track.uri,
-                                fieldnames[1]: track.name,
-                                fieldnames[2]: artist.name,
-                                fieldnames[3]: str(analysis.valence),
-                                fieldnames[4]: str(analysis.energy),
-                                fieldnames[5]: str(analysis.speechiness),
-                                fieldnames[6]: str(analysis.tempo),
-                                fieldnames[7]: str(analysis.duration_ms),
-                                fieldnames[8]: str(analysis.instrumentalness),
-                                fieldnames[9]: str(analysis.acousticness),
-                                fieldnames[10]: str(analysis.danceability),
-                                fieldnames[11]: str(
-                                    KEY_INTEGER_TO_NAME_MAP[analysis.key]
-                                ),
-                                fieldnames[12]: str(MODE_MAP[analysis.mode]),
-                                fieldnames[13]: str(analysis.liveness),
-                                fieldnames[14]: str(analysis.loudness),
-                                fieldnames[15]: str(analysis.speechiness),
-                                fieldnames[16]: str(analysis.time_signature),
-                            }
-                        )
-                        already_seen.append(songname)
-                        log_track_characteristics(artist, track_analysis)
+    with AnalysisCsvWriter(filename) as writer:
+        # Track analyses may be a stream; match and write them a chunk at a time
+        # so rows land in the CSV while the crawl is still running
+        for chunk in chunked(track_analyses, RECOMMEND_CHUNK_SIZE):
+            candidates = [
+                track_analysis
+                for track_analysis in chunk
+                if track_analysis.analysis
+                and matcher.allowable_track(
+                    track_analysis.track, allow_explicit=allow_explicit
+                )
+            ]
+            accepted = matcher.acceptable_indices(
+                [track_analysis.analysis for track_analysis in candidates], criteria
+            )
+
+            for index in accepted:
+                track_analysis = candidates[index]
+                if writer.write(track_analysis.track, artist, track_analysis.analysis):
+                    log_track_characteristics(artist, track_analysis)
+            writer.flush()
 
 
 def main():
     arguments = sys.argv[-1]
     parsed_args = parse_args(arguments)
+
+    if parsed_args.metrics_out:
+        atexit.register(metrics.write, parsed_args.metrics_out)
+    if parsed_args.purge_cache:
+        cache.purge()
+    if parsed_args.no_cache:
+        cache.enabled = False
+        feature_store.enabled = False
+
     parsed_args.func(parsed_args)
 
 
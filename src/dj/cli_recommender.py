@@ -1,12 +1,18 @@
 import argparse
+import atexit
 import sys
-import toml
 
 from .log_setup import get_logger
-from . import matcher
+from .output import AnalysisCsvWriter, output_csv_path
 from dj.data import TrackAnalysisArtist
 from dj.wrapper.playlist import add_track_uris_to_existing_playlist_name
-from dj.wrapper.recommender import build_recommended_tracklist, recommend
+from dj.wrapper.recommender import (
+    DEFAULT_REQUEST_BUDGET,
+    build_recommended_tracklist,
+    recommend,
+    recommend_pool,
+)
+from dj.wrapper.metrics import metrics
 
 logger = get_logger(__name__)
 
@@ -18,7 +24,12 @@ def parse_args(arguments):
         "-p", "--playlist_name", required=True, help="Name for new playlist"
     )
     parser.add_argument(
-        "-e", "--existing", required=False, type=bool, help="Existing Playlist?", default=False
+        "-e",
+        "--existing",
+        required=False,
+        type=bool,
+        help="Existing Playlist?",
+        default=False,
     )
     parser.add_argument(
         "-u",
@@ -27,10 +38,7 @@ def parse_args(arguments):
         required=True,
     )
     parser.add_argument(
-        "-l",
-        "--limit",
-        default=20,
-        help="Number of recommendations to limit to."
+        "-l", "--limit", default=20, help="Number of recommendations to limit to."
     )
     parser.add_argument(
         "-g",
@@ -61,9 +69,7 @@ def parse_args(arguments):
         default=False,
     )
     parser.add_argument(
-        "-w",
-        "--write_analysis_to_output_file",
-        action=argparse.BooleanOptionalAction
+        "-w", "--write_analysis_to_output_file", action=argparse.BooleanOptionalAction
     )
     parser.add_argument(
         "-i",
@@ -77,7 +83,23 @@ def parse_args(arguments):
         help="CSV file",
         required=False,
     )
-
+    parser.add_argument(
+        "--target",
+        type=int,
+        help="Fan out over seed groups until this many tracks pass the filter",
+        required=False,
+    )
+    parser.add_argument(
+        "--request_budget",
+        type=int,
+        default=DEFAULT_REQUEST_BUDGET,
+        help="With --target: most recommendation calls to make",
+    )
+    parser.add_argument(
+        "--metrics_out",
+        "--metrics-out",
+        help="Write per-endpoint API metrics (.json, or .prom/.txt for Prometheus)",
+    )
 
     return parser.parse_args()
 
@@ -86,99 +108,75 @@ def main():
     arguments = sys.argv[-1]
     parsed_args = parse_args(arguments)
 
+    if parsed_args.metrics_out:
+        atexit.register(metrics.write, parsed_args.metrics_out)
+
     assert parsed_args.genres or parsed_args.artist_ids or parsed_args.track_ids
 
     tracks_artists_to_add = []
 
-    recs = recommend(parsed_args.artist_ids, parsed_args.genres, track_ids=parsed_args.track_ids, limit=parsed_args.limit)
-    track_analyses, artists = build_recommended_tracklist(recs)
-
-    for track_analysis in track_analyses:
-        track = track_analysis.track
-        if analysis := track_analysis.analysis:
-            if parsed_args.filter:
-                criteria = toml.load(parsed_args.input_toml_file)["characteristics"]
-                if matcher.keep_track(criteria, track, analysis, allow_explicit=parsed_args.allow_explicit):
-                    track_analysis_index = track_analyses.index(track_analysis)
-                    corresponding_artist = artists[track_analysis_index]
+    criteria = None
+    if parsed_args.filter:
+        from . import matcher  # NumPy; skip the import unless filtering
+
+        criteria = matcher.CompiledCriteria.from_toml(parsed_args.input_toml_file)
+
+    def keep(track_analysis, artist):
+        return criteria is None or matcher.keep_track(
+            criteria,
+            track_analysis.track,
+            track_analysis.analysis,
+            allow_explicit=parsed_args.allow_explicit,
+        )
+
+    if parsed_args.target:
+        tracks_artists_to_add = recommend_pool(
+            parsed_args.artist_ids,
+            parsed_args.genres,
+            parsed_args.track_ids,
+            parsed_args.target,
+            accept=keep,
+            request_budget=parsed_args.request_budget,
+        )
+    else:
+        recs = recommend(
+            parsed_args.artist_ids,
+            parsed_args.genres,
+            track_ids=parsed_args.track_ids,
+            limit=parsed_args.limit,
+        )
+        track_analyses, artists = build_recommended_tracklist(recs)
+
+        for track_analysis, artist in zip(track_analyses, artists):
+            if track_analysis and artist and track_analysis.analysis:
+                if keep(track_analysis, artist):
                     tracks_artists_to_add.append(
-                        TrackAnalysisArtist(track_analysis=track_analysis, artist=corresponding_artist)
+                        TrackAnalysisArtist(
+                            track_analysis=track_analysis, artist=artist
+                        )
                     )
-            else:
-                track_analysis_index = track_analyses.index(track_analysis)
-                corresponding_artist = artists[track_analysis_index]
-                tracks_artists_to_add.append(
-                    TrackAnalysisArtist(track_analysis=track_analysis, artist=corresponding_artist)
-                )
-
 
     if parsed_args.existing:
         add_track_uris_to_existing_playlist_name(
             parsed_args.username,
             parsed_args.playlist_name,
-            [taa.track_analysis.track.uri for taa in tracks_artists_to_add]
+            [taa.track_analysis.track.uri for taa in tracks_artists_to_add],
         )
 
         if parsed_args.write_analysis_to_output_file:
-            assert parsed_args.output_file_name
-            filename = f"artist_csvs/{parsed_args.output_file_name}.csv"
-
-            if Path(filename).exists():
-                existing = True
-            else:
-                existing = False
-
-            with open(filename, "a") as fh:
-                fieldnames = [
-                    "track_uri",
-                    "track_name",
-                    "artist_name",
-                    "valence", #1
-                    "energy", #2
-                    "speechiness", #3
-                    "bpm",
-                    "duration_ms",
-                    "instrumentalness" #4,
-                    "acousticness", #5
-                    "danceability", #6
-                    "key",
-                    "mode",
-                    "liveness", #7
-                    "loudness", #9
-                    "time_signature",
-                ]
-                writer = csv.DictWriter(fh, fieldnames=fieldnames)
-
-                if not existing:
-                    writer.writeheader()
+            assert parsed_args.output_csv_file
+            filename = output_csv_path(parsed_args.output_csv_file)
 
+            with AnalysisCsvWriter(filename) as writer:
                 for taa in tracks_artists_to_add:
-                    track = taa.track_analysis.track
-                    analysis = taa.track_analysis.analysis
-                    artist = taa.artist
-                    writer.writerow({
-                        fieldnames[0]: track.uri,
-                        fieldnames[1]: track.name,
-                        fieldnames[2]: artist.name,
-                        fieldnames[3]: str(analysis.valence),
-                        fieldnames[4]: str(analysis.energy),
-                        fieldnames[5]: str(analysis.speechiness),
-                        fieldnames[6]: str(analysis.tempo),
-                        fieldnames[7]: str(analysis.duration_ms),
-                        fieldnames[8]: str(analysis.instrumentalness),
-                        fieldnames[9]: str(analysis.acousticness),
-                        fieldnames[10]: str(analysis.danceability),
-                        fieldnames[11]: str(
-                            KEY_INTEGER_TO_NAME_MAP[analysis.key]
-                        ),
-                        fieldnames[12]: str(MODE_MAP[analysis.mode]),
-                        fieldnames[13]: str(analysis.liveness),
-                        fieldnames[14]: str(analysis.loudness),
-                        fieldnames[15]: str(analysis.time_signature),
-                    }
-                )
+                    writer.write(
+                        taa.track_analysis.track,
+                        taa.artist,
+                        taa.track_analysis.analysis,
+                    )
     else:
         pass
 
+
 if __name__ == "__main__":
     main()
@@ -1,4 +1,5 @@
-from typing import List
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Union
 from dataclasses import dataclass
 
 
@@ -53,5 +54,140 @@ class Album:
 
 @dataclass
 class TrackAnalysisArtist:
-    track_analysis: TrackAnalysis
+    track_analysis: Union[TrackAnalysis, "CompactTrackAnalysis"]
     artist: Artist
+
+
+# Compact storage for large catalogs. The dataclasses above keep a __dict__ and
+# the unused URL fields per track; these keep only the numbers we filter on.
+INTEGER_FEATURES = ("key", "mode", "duration_ms", "time_signature")
+FLOAT_FEATURES = (
+    "danceability",
+    "energy",
+    "loudness",
+    "speechiness",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "valence",
+    "tempo",
+)
+NUMERIC_FEATURES = FLOAT_FEATURES + INTEGER_FEATURES
+
+
+def _audio_features_from_values(uri: str, values: Dict[str, Any]) -> AudioFeatures:
+    track_id = uri.split(":")[-1]
+    return AudioFeatures(
+        type="audio_features",
+        id=track_id,
+        uri=uri,
+        track_href=f"https://api.spotify.com/v1/tracks/{track_id}",
+        analysis_url=f"https://api.spotify.com/v1/audio-analysis/{track_id}",
+        **values,
+    )
+
+
+class CompactAudioFeatures:
+    __slots__ = ("uri",) + NUMERIC_FEATURES
+
+    def __init__(self, uri: str, **values):
+        self.uri = uri
+        for name in FLOAT_FEATURES:
+            setattr(self, name, float(values[name]))
+        for name in INTEGER_FEATURES:
+            setattr(self, name, int(values[name]))
+
+    @classmethod
+    def from_audio_features(cls, analysis: AudioFeatures) -> "CompactAudioFeatures":
+        return cls(
+            analysis.uri, **{name: getattr(analysis, name) for name in NUMERIC_FEATURES}
+        )
+
+    def to_audio_features(self) -> AudioFeatures:
+        return _audio_features_from_values(
+            self.uri, {name: getattr(self, name) for name in NUMERIC_FEATURES}
+        )
+
+
+class CompactTrackAnalysis:
+    __slots__ = ("name", "uri", "explicit", "analysis")
+
+    def __init__(self, name: str, uri: str, explicit: bool, analysis):
+        self.name = name
+        self.uri = uri
+        self.explicit = explicit
+        self.analysis = analysis
+
+    @property
+    def track(self) -> "CompactTrackAnalysis":
+        # Quacks like TrackAnalysis.track (name/uri/explicit)
+        return self
+
+    @classmethod
+    def from_track_analysis(cls, track_analysis: TrackAnalysis):
+        track = track_analysis.track
+        return cls(
+            track.name,
+            track.uri,
+            track.explicit,
+            CompactAudioFeatures.from_audio_features(track_analysis.analysis),
+        )
+
+    def to_track_analysis(self) -> TrackAnalysis:
+        return TrackAnalysis(
+            track=Track(name=self.name, uri=self.uri, explicit=self.explicit),
+            analysis=self.analysis.to_audio_features(),
+        )
+
+
+class FeatureTable:
+    # Struct-of-arrays: one typed array per feature, one row per track
+    def __init__(self):
+        self.names: List[str] = []
+        self.uris: List[str] = []
+        self.feature_uris: List[str] = []
+        self.explicit = array("b")
+        self.columns: Dict[str, array] = {
+            **{name: array("d") for name in FLOAT_FEATURES},
+            **{name: array("q") for name in INTEGER_FEATURES},
+        }
+
+    @classmethod
+    def from_track_analyses(
+        cls, track_analyses: Iterable[TrackAnalysis]
+    ) -> "FeatureTable":
+        table = cls()
+        table.extend(track_analyses)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.uris)
+
+    def append(self, track_analysis: TrackAnalysis):
+        track = track_analysis.track
+        analysis = track_analysis.analysis
+        self.names.append(track.name)
+        self.uris.append(track.uri)
+        self.feature_uris.append(analysis.uri)
+        self.explicit.append(bool(track.explicit))
+        for name, column in self.columns.items():
+            column.append(getattr(analysis, name))
+
+    def extend(self, track_analyses: Iterable[TrackAnalysis]):
+        for track_analysis in track_analyses:
+            self.append(track_analysis)
+
+    def row(self, index: int) -> CompactTrackAnalysis:
+        values = {name: column[index] for name, column in self.columns.items()}
+        return CompactTrackAnalysis(
+            self.names[index],
+            self.uris[index],
+            bool(self.explicit[index]),
+            CompactAudioFeatures(self.feature_uris[index], **values),
+        )
+
+    def __iter__(self) -> Iterator[CompactTrackAnalysis]:
+        return (self.row(i) for i in range(len(self)))
+
+    def to_track_analyses(self) -> List[TrackAnalysis]:
+        return [row.to_track_analysis() for row in self]
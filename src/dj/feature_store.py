@@ -0,0 +1,239 @@
+import csv
+import operator
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .data import (
+    FLOAT_FEATURES,
+    INTEGER_FEATURES,
+    NUMERIC_FEATURES,
+    Artist,
+    CompactAudioFeatures,
+    CompactTrackAnalysis,
+    TrackAnalysisArtist,
+)
+from .log_setup import get_logger
+from .logging import KEY_INTEGER_TO_NAME_MAP, MODE_MAP
+
+logger = get_logger(__name__)
+
+DEFAULT_FEATURE_STORE_PATH = Path.home() / ".cache" / "spotify-dj" / "features.sqlite"
+INSERT_BATCH_SIZE = 500
+
+# Columns a criteria file can bound, each with its own index
+INDEXED_FEATURES = (
+    "acousticness",
+    "danceability",
+    "duration_ms",
+    "energy",
+    "instrumentalness",
+    "liveness",
+    "loudness",
+    "mode",
+    "speechiness",
+    "tempo",
+    "valence",
+)
+SQL_COMPARISONS = {operator.ge: ">=", operator.le: "<=", operator.eq: "="}
+
+# CSV columns (see output.FIELDNAMES) back to feature values
+KEY_NAME_TO_INTEGER = {name: key for key, name in KEY_INTEGER_TO_NAME_MAP.items()}
+MODE_NAME_TO_INTEGER = {name: mode for mode, name in MODE_MAP.items()}
+
+_COLUMNS = ("uri", "name", "explicit", "artist_id", "artist_name") + NUMERIC_FEATURES
+
+
+class FeatureStore:
+    # Every track analysis we have seen, one row per track URI with a column
+    # (and an index) per audio feature, so criteria become an indexed SQL range
+    # query instead of a crawl and a scan.
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.enabled = True
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            columns = ", ".join(
+                [f"{name} REAL NOT NULL" for name in FLOAT_FEATURES]
+                + [f"{name} INTEGER NOT NULL" for name in INTEGER_FEATURES]
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                " uri TEXT PRIMARY KEY,"
+                " name TEXT NOT NULL,"
+                " explicit INTEGER,"  # NULL when ingested from a CSV
+                " artist_id TEXT,"
+                " artist_name TEXT NOT NULL,"
+                f" {columns},"
+                " updated_at REAL NOT NULL)"
+            )
+            for name in INDEXED_FEATURES:
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS tracks_{name} ON tracks ({name})"
+                )
+        return self._conn
+
+    def _insert(self, rows: List[Tuple], replace: bool = True):
+        if not rows:
+            return
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        placeholders = ", ".join("?" * (len(_COLUMNS) + 1))
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                f"{verb} INTO tracks ({', '.join(_COLUMNS)}, updated_at)"
+                f" VALUES ({placeholders})",
+                rows,
+            )
+            conn.commit()
+
+    def add(self, artist: Artist, track_analyses: Iterable[Any]):
+        now = time.time()
+        self._insert(
+            [
+                (
+                    ta.track.uri,
+                    ta.track.name,
+                    int(ta.track.explicit),
+                    artist.id,
+                    artist.name,
+                    *(getattr(ta.analysis, name) for name in NUMERIC_FEATURES),
+                    now,
+                )
+                for ta in track_analyses
+            ]
+        )
+
+    def record(self, artist: Artist, track_analyses: Iterable[Any]) -> Iterator[Any]:
+        # Passes a crawl's stream through unchanged, storing it in batches
+        if not self.enabled:
+            yield from track_analyses
+            return
+        pending = []
+        for track_analysis in track_analyses:
+            pending.append(track_analysis)
+            if len(pending) >= INSERT_BATCH_SIZE:
+                self.add(artist, pending)
+                pending = []
+            yield track_analysis
+        self.add(artist, pending)
+
+    def ingest_csv(self, filename: str) -> int:
+        # Rows from artist_csvs/*.csv; never overwrites a row that came from the API
+        now = time.time()
+        with open(filename, newline="") as fh:
+            rows = [
+                (
+                    row["track_uri"],
+                    row["track_name"],
+                    None,
+                    None,
+                    row["artist_name"],
+                    *(_csv_value(row, name) for name in NUMERIC_FEATURES),
+                    now,
+                )
+                for row in csv.DictReader(fh)
+            ]
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            self._insert(rows[i : i + INSERT_BATCH_SIZE], replace=False)
+        return len(rows)
+
+    def query(
+        self, criteria, allow_explicit: bool = False, limit: Optional[int] = None
+    ) -> List[TrackAnalysisArtist]:
+        # criteria: a matcher.CompiledCriteria; only its bounds/product are read
+        clauses, params = [], []
+        for column, compare, value in criteria.bounds:
+            clauses.append(f"{column} {SQL_COMPARISONS[compare]} ?")
+            params.append(value)
+        if criteria.product is not None:
+            clauses.append("valence * energy > ?")
+            params.append(criteria.product)
+        if not allow_explicit:
+            # Unknown (CSV-ingested) counts as explicit until the API says otherwise
+            clauses.append("explicit = 0")
+
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM tracks"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY artist_name, name"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        return [_track_analysis_artist(row) for row in rows]
+
+    def get_many(self, uris: Iterable[str]) -> Dict[str, TrackAnalysisArtist]:
+        uris = list(uris)
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(uris), 500):  # stay under SQLite's variable limit
+                chunk = uris[i : i + 500]
+                rows = conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM tracks"
+                    f" WHERE uri IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for row in rows:
+                    found[row[0]] = _track_analysis_artist(row)
+        return found
+
+    def feature_rows(
+        self, columns: Sequence[str], allow_explicit: bool = True
+    ) -> Tuple[List[str], List[Tuple[float, ...]]]:
+        # URIs plus the requested feature columns, for building vector indexes
+        sql = f"SELECT uri, {', '.join(columns)} FROM tracks"
+        if not allow_explicit:
+            sql += " WHERE explicit = 0"
+        with self._lock:
+            rows = self._connection().execute(sql).fetchall()
+        return [row[0] for row in rows], [row[1:] for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = (
+                self._connection().execute("SELECT COUNT(*) FROM tracks").fetchone()
+            )
+        return count
+
+    def optimize(self):
+        # Refresh the planner's statistics so it picks the most selective index
+        with self._lock:
+            self._connection().execute("ANALYZE")
+
+
+def _csv_value(row, name: str):
+    if name == "tempo":
+        return float(row["bpm"])
+    if name == "key":
+        return KEY_NAME_TO_INTEGER[row["key"]]
+    if name == "mode":
+        return MODE_NAME_TO_INTEGER[row["mode"]]
+    if name in INTEGER_FEATURES:
+        return int(float(row[name]))
+    return float(row[name])
+
+
+def _track_analysis_artist(row: Tuple) -> TrackAnalysisArtist:
+    uri, name, explicit, artist_id, artist_name, *values = row
+    analysis = CompactAudioFeatures(uri, **dict(zip(NUMERIC_FEATURES, values)))
+    return TrackAnalysisArtist(
+        track_analysis=CompactTrackAnalysis(name, uri, bool(explicit), analysis),
+        artist=Artist(name=artist_name, id=artist_id, genres=[]),
+    )
+
+
+feature_store = FeatureStore(
+    Path(os.getenv("DJ_FEATURE_STORE_PATH", DEFAULT_FEATURE_STORE_PATH))
+)
@@ -1,73 +1,144 @@
-from typing import Any, Dict
+import operator
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Union
 
-from .data import Artist, AudioFeatures, Track
+import numpy as np
+import toml
+
+from .data import Artist, AudioFeatures, FeatureTable, Track
 from .log_setup import get_logger
 
 logger = get_logger(__name__)
 
+# Criteria key -> AudioFeatures attribute, checked in this order
+CRITERIA_FIELDS = [
+    ("max_duration_ms", "duration_ms"),
+    ("min_duration_ms", "duration_ms"),
+    ("min_valence", "valence"),
+    ("max_valence", "valence"),
+    ("min_energy", "energy"),
+    ("max_energy", "energy"),
+    ("min_tempo", "tempo"),
+    ("max_tempo", "tempo"),
+    ("mode", "mode"),
+    ("min_instrumentalness", "instrumentalness"),
+    ("max_instrumentalness", "instrumentalness"),
+    ("min_speechiness", "speechiness"),
+    ("max_speechiness", "speechiness"),
+    ("min_acousticness", "acousticness"),
+    ("max_acousticness", "acousticness"),
+    ("min_danceability", "danceability"),
+    ("max_danceability", "danceability"),
+    ("min_liveness", "liveness"),
+    ("max_liveness", "liveness"),
+    ("min_loudness", "loudness"),
+    ("max_loudness", "loudness"),
+]
+FEATURE_COLUMNS = sorted({column for _, column in CRITERIA_FIELDS})
+CRITERIA_KEYS = {keyname for keyname, _ in CRITERIA_FIELDS} | {"product"}
+
 
 def allowable_track(track, allow_explicit=False):
     return allow_explicit or not track.explicit
 
 
-def compare_values(section: Dict[str, Any], keyname: str, actual_value: float) -> bool:
-    if criteria_value := section.get(keyname):
-        if keyname.startswith("min"):
-            if keyname == "tempo":
-                return actual_value >= criteria_value or (2 * actual_value >= 2 * criteria_value)
-            else:
-                return actual_value >= criteria_value
-        elif keyname.startswith("max"):
-            if keyname == "tempo":
-                return actual_value <= criteria_value or (2 * actual_value <= 2 * criteria_value)
-            else:
-                return actual_value <= criteria_value
-        else:
-            return actual_value == criteria_value
-    else:
-        return True
+class CompiledCriteria:
+    # Built once from a TOML `characteristics` table. Absent keys are dropped (a 0
+    # is a bound, e.g. mode = 0 is minor), unknown keys are rejected so typos
+    # don't silently match everything.
+    def __init__(self, section: Dict[str, Any]):
+        if unknown := set(section) - CRITERIA_KEYS:
+            raise ValueError(f"Unknown criteria key(s): {', '.join(sorted(unknown))}")
+
+        self.bounds: List[Tuple[str, Callable, float]] = []
+        for keyname, column in CRITERIA_FIELDS:
+            criteria_value = section.get(keyname)
+            if criteria_value is not None:
+                if keyname.startswith("min"):
+                    compare = operator.ge
+                elif keyname.startswith("max"):
+                    compare = operator.le
+                else:
+                    compare = operator.eq
+                self.bounds.append((column, compare, criteria_value))
+
+        self.product = section.get("product")
+        self._accessors = [
+            (operator.attrgetter(column), compare, value)
+            for column, compare, value in self.bounds
+        ]
 
+    @classmethod
+    def from_toml(cls, filename: str) -> "CompiledCriteria":
+        return cls(toml.load(filename)["characteristics"])
 
-def valence_energy_relationship(
-    section: Dict[str, Any], analysis: AudioFeatures
-) -> bool:
-    valence_energy = analysis.valence * analysis.energy
-    if product_value := section.get("product"):
-        return valence_energy > product_value
-    else:
+    def matches(self, analysis: AudioFeatures) -> bool:
+        for get, compare, value in self._accessors:
+            if not compare(get(analysis), value):
+                return False
+        if self.product is not None:
+            return analysis.valence * analysis.energy > self.product
         return True
 
+    def mask(self, matrix: np.ndarray) -> np.ndarray:
+        columns = {column: matrix[:, i] for i, column in enumerate(FEATURE_COLUMNS)}
+        mask = np.ones(len(matrix), dtype=bool)
+        for column, compare, value in self.bounds:
+            mask &= compare(columns[column], value)
+        if self.product is not None:
+            mask &= columns["valence"] * columns["energy"] > self.product
+        return mask
 
-def acceptable_track(track: Track, analysis: AudioFeatures, criteria: Dict[str, Any]):
-    return (
-        compare_values(criteria, "max_duration_ms", analysis.duration_ms)
-        and compare_values(criteria, "min_duration_ms", analysis.duration_ms)
-        and compare_values(criteria, "min_valence", analysis.valence)
-        and compare_values(criteria, "max_valence", analysis.valence)
-        and compare_values(criteria, "min_energy", analysis.energy)
-        and compare_values(criteria, "max_energy", analysis.energy)
-        and compare_values(criteria, "min_tempo", analysis.tempo)
-        and compare_values(criteria, "max_tempo", analysis.tempo)
-        and compare_values(criteria, "mode", analysis.mode)
-        and compare_values(criteria, "min_instrumentalness", analysis.instrumentalness)
-        and compare_values(criteria, "max_instrumentalness", analysis.instrumentalness)
-        and compare_values(criteria, "min_speechiness", analysis.speechiness)
-        and compare_values(criteria, "min_speechiness", analysis.speechiness)
-        and compare_values(criteria, "min_acousticness", analysis.acousticness)
-        and compare_values(criteria, "max_acousticness", analysis.acousticness)
-        and compare_values(criteria, "min_danceability", analysis.danceability)
-        and compare_values(criteria, "max_danceability", analysis.danceability)
-        and compare_values(criteria, "min_liveness", analysis.liveness)
-        and compare_values(criteria, "max_liveness", analysis.liveness)
-        and compare_values(criteria, "min_loudness", analysis.loudness)
-        and compare_values(criteria, "max_loudness", analysis.loudness)
-        and valence_energy_relationship(criteria, analysis)
-    )
+    def indices(
+        self, analyses: Union[FeatureTable, Sequence[AudioFeatures]]
+    ) -> np.ndarray:
+        return np.flatnonzero(self.mask(feature_matrix(analyses)))
+
+
+Criteria = Union[CompiledCriteria, Dict[str, Any]]
+
+
+def compile_criteria(criteria: Criteria) -> CompiledCriteria:
+    if isinstance(criteria, CompiledCriteria):
+        return criteria
+    return CompiledCriteria(criteria)
+
+
+def acceptable_track(track: Track, analysis: AudioFeatures, criteria: Criteria):
+    return compile_criteria(criteria).matches(analysis)
+
+
+def feature_matrix(
+    analyses: Union[FeatureTable, Sequence[AudioFeatures]],
+) -> np.ndarray:
+    # One row per track, one column per FEATURE_COLUMNS entry
+    if isinstance(analyses, FeatureTable):
+        return np.column_stack(
+            [
+                np.asarray(analyses.columns[column], dtype=float)
+                for column in FEATURE_COLUMNS
+            ]
+        ).reshape(len(analyses), len(FEATURE_COLUMNS))
+    return np.array(
+        [[getattr(a, column) for column in FEATURE_COLUMNS] for a in analyses],
+        dtype=float,
+    ).reshape(len(analyses), len(FEATURE_COLUMNS))
+
+
+def acceptable_mask(matrix: np.ndarray, criteria: Criteria) -> np.ndarray:
+    return compile_criteria(criteria).mask(matrix)
+
+
+def acceptable_indices(
+    analyses: Union[FeatureTable, Sequence[AudioFeatures]], criteria: Criteria
+) -> np.ndarray:
+    return compile_criteria(criteria).indices(analyses)
 
 
 def log_output_csv(artist: Artist):
     logger.info("Writing results to '%s.csv'", artist.name)
 
 
-def keep_track(criteria, track, analysis, allow_explicit=False):
-    return allowable_track(track, allow_explicit=allow_explicit) and acceptable_track(track, analysis, criteria)
+def keep_track(criteria: Criteria, track, analysis, allow_explicit=False):
+    return allowable_track(track, allow_explicit=allow_explicit) and acceptable_track(
+        track, analysis, criteria
+    )
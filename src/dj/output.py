@@ -0,0 +1,121 @@
+import csv
+import unicodedata
+from pathlib import Path
+from typing import Dict, Set
+
+from .data import Artist, AudioFeatures, Track
+from .logging import KEY_INTEGER_TO_NAME_MAP, MODE_MAP
+
+OUTPUT_DIR = "artist_csvs"
+
+# Matches the files already in artist_csvs/, including the repeated column
+FIELDNAMES = [
+    "track_uri",
+    "track_name",
+    "artist_name",
+    "valence",
+    "energy",
+    "speechiness",
+    "bpm",
+    "duration_ms",
+    "instrumentalness",
+    "acousticness",
+    "danceability",
+    "key",
+    "mode",
+    "liveness",
+    "loudness",
+    "speechiness",
+    "time_signature",
+]
+
+
+def output_csv_path(name: str) -> str:
+    return f"{OUTPUT_DIR}/{name}.csv"
+
+
+def song_key(track_name: str, artist_name: str) -> str:
+    # Case, accents-as-composed and whitespace differences don't make a new song
+    def normalize(value: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", value).casefold().split())
+
+    return f"{normalize(track_name)}__{normalize(artist_name)}"
+
+
+def analysis_row(track: Track, artist: Artist, analysis: AudioFeatures):
+    return {
+        "track_uri": track.uri,
+        "track_name": track.name,
+        "artist_name": artist.name,
+        "valence": str(analysis.valence),
+        "energy": str(analysis.energy),
+        "speechiness": str(analysis.speechiness),
+        "bpm": str(analysis.tempo),
+        "duration_ms": str(analysis.duration_ms),
+        "instrumentalness": str(analysis.instrumentalness),
+        "acousticness": str(analysis.acousticness),
+        "danceability": str(analysis.danceability),
+        "key": str(KEY_INTEGER_TO_NAME_MAP[int(analysis.key)]),
+        "mode": str(MODE_MAP[int(analysis.mode)]),
+        "liveness": str(analysis.liveness),
+        "loudness": str(analysis.loudness),
+        "time_signature": str(analysis.time_signature),
+    }
+
+
+class CsvDedupeIndex:
+    # URIs and normalized song keys already in an output CSV. Read once per
+    # process, then kept up to date as rows are appended.
+    def __init__(self, filename: str):
+        self.uris: Set[str] = set()
+        self.keys: Set[str] = set()
+        if Path(filename).exists():
+            with open(filename, newline="") as fh:
+                for row in csv.DictReader(fh):
+                    self.uris.add(row["track_uri"])
+                    self.keys.add(song_key(row["track_name"], row["artist_name"]))
+
+    def add(self, track_uri: str, track_name: str, artist_name: str) -> bool:
+        # False if the track is already in the file
+        key = song_key(track_name, artist_name)
+        if track_uri in self.uris or key in self.keys:
+            return False
+        self.uris.add(track_uri)
+        self.keys.add(key)
+        return True
+
+
+_dedupe_indexes: Dict[str, CsvDedupeIndex] = {}
+
+
+def dedupe_index(filename: str) -> CsvDedupeIndex:
+    if filename not in _dedupe_indexes:
+        _dedupe_indexes[filename] = CsvDedupeIndex(filename)
+    return _dedupe_indexes[filename]
+
+
+class AnalysisCsvWriter:
+    # Appends analysis rows to an output CSV, skipping tracks it already holds
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.index = dedupe_index(filename)
+
+    def __enter__(self) -> "AnalysisCsvWriter":
+        existing = Path(self.filename).exists()
+        self._fh = open(self.filename, "a", newline="")
+        self._writer = csv.DictWriter(self._fh, fieldnames=FIELDNAMES)
+        if not existing:
+            self._writer.writeheader()
+        return self
+
+    def __exit__(self, *exc):
+        self._fh.close()
+
+    def write(self, track: Track, artist: Artist, analysis: AudioFeatures) -> bool:
+        if not self.index.add(track.uri, track.name, artist.name):
+            return False
+        self._writer.writerow(analysis_row(track, artist, analysis))
+        return True
+
+    def flush(self):
+        self._fh.flush()
@@ -0,0 +1,58 @@
+import threading
+from queue import Queue
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_BUFFER = 256
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def buffered(iterable: Iterable[T], maxsize: int = DEFAULT_BUFFER) -> Iterator[T]:
+    # Runs `iterable` on a background thread, handing items over through a
+    # bounded queue: the producer blocks once `maxsize` items are waiting, so a
+    # slow consumer holds back the crawl instead of letting memory grow.
+    queue: Queue = Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                queue.put(item)
+        except BaseException as e:
+            queue.put(_Failure(e))
+        else:
+            queue.put(_DONE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while (item := queue.get()) is not _DONE:
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        while producer.is_alive():  # unblock a producer stuck on a full queue
+            while not queue.empty():
+                queue.get_nowait()
+            producer.join(timeout=0.1)
+
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    chunk: List[T] = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,130 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .log_setup import get_logger
+
+logger = get_logger(__name__)
+
+# Dimensions of the sound-alike space. Most features are already 0..1; tempo
+# and loudness are mapped onto a comparable range with the bounds below.
+SIMILARITY_FEATURES = (
+    "acousticness",
+    "danceability",
+    "energy",
+    "instrumentalness",
+    "liveness",
+    "loudness",
+    "speechiness",
+    "tempo",
+    "valence",
+)
+FEATURE_RANGES = {
+    "loudness": (-60.0, 0.0),  # dB
+    "tempo": (40.0, 220.0),  # BPM
+}
+DEFAULT_NEIGHBOURS = 10
+
+Neighbours = List[Tuple[str, float]]
+
+
+def parse_weights(pairs: Optional[Sequence[str]]) -> Dict[str, float]:
+    # ["energy=2", "tempo=0.5"] -> {"energy": 2.0, "tempo": 0.5}
+    weights = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        if name not in SIMILARITY_FEATURES:
+            raise ValueError(f"Unknown feature '{name}' in weight '{pair}'")
+        try:
+            weight = float(value)
+        except ValueError:
+            raise ValueError(f"Weight for '{name}' is not a number: '{pair}'")
+        if not 0 <= weight < float("inf"):  # also rejects nan
+            raise ValueError(f"Weight for '{name}' must be 0 or more: '{pair}'")
+        weights[name] = weight
+    return weights
+
+
+def _as_matrix(rows: Sequence[Sequence[float]]) -> np.ndarray:
+    return np.asarray(rows, dtype=float).reshape(-1, len(SIMILARITY_FEATURES))
+
+
+class SimilarityIndex:
+    # KD-tree over weighted, range-normalised feature vectors. Euclidean
+    # distance there is sqrt(sum(w * d^2)), so each column is scaled by sqrt(w);
+    # a weight of 0 drops that feature from the comparison.
+    def __init__(
+        self,
+        uris: List[str],
+        rows: Sequence[Sequence[float]],
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        weights = weights or {}
+        self.uris = uris
+        self.positions = {uri: i for i, uri in enumerate(uris)}
+        self.scale = np.array(
+            [np.sqrt(weights.get(name, 1.0)) for name in SIMILARITY_FEATURES]
+        )
+        self.points = self.vectors(_as_matrix(rows))
+        self.tree = cKDTree(self.points)
+
+    @classmethod
+    def from_store(
+        cls, store, weights: Optional[Dict[str, float]] = None, allow_explicit=True
+    ) -> "SimilarityIndex":
+        uris, rows = store.feature_rows(SIMILARITY_FEATURES, allow_explicit)
+        index = cls(uris, rows, weights)
+        logger.info("Indexed %d tracks for similarity search", len(uris))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.uris)
+
+    def __contains__(self, uri: str) -> bool:
+        return uri in self.positions
+
+    def vectors(self, raw: np.ndarray) -> np.ndarray:
+        # raw: one row per track, columns in SIMILARITY_FEATURES order
+        normalised = raw.copy()
+        for name, (low, high) in FEATURE_RANGES.items():
+            column = SIMILARITY_FEATURES.index(name)
+            normalised[:, column] = (raw[:, column] - low) / (high - low)
+        return normalised * self.scale
+
+    def query(
+        self, seed_uris: Sequence[str], k: int = DEFAULT_NEIGHBOURS
+    ) -> List[Neighbours]:
+        # All seeds must be indexed; each seed is left out of its own results
+        points = self.points[[self.positions[uri] for uri in seed_uris]]
+        return self._nearest(points, k, exclude=seed_uris)
+
+    def query_features(
+        self, rows: Sequence[Sequence[float]], k: int = DEFAULT_NEIGHBOURS
+    ) -> List[Neighbours]:
+        # Seeds from outside the catalog, as raw SIMILARITY_FEATURES rows
+        points = self.vectors(_as_matrix(rows))
+        return self._nearest(points, k)
+
+    def _nearest(
+        self, points: np.ndarray, k: int, exclude: Sequence[str] = ()
+    ) -> List[Neighbours]:
+        if k < 1:
+            raise ValueError(f"Need at least one neighbour, not {k}")
+        if not len(points) or not len(self):
+            return [[] for _ in points]
+        # One extra neighbour covers the seed finding itself
+        count = min(k + 1, len(self))
+        distances, indices = self.tree.query(points, k=count, workers=-1)
+        distances = distances.reshape(len(points), count)
+        indices = indices.reshape(len(points), count)
+
+        results = []
+        for row, seed in enumerate(list(exclude) or [None] * len(points)):
+            neighbours = [
+                (self.uris[i], float(d))
+                for d, i in zip(distances[row], indices[row])
+                if self.uris[i] != seed
+            ]
+            results.append(neighbours[:k])
+        return results
@@ -0,0 +1,3 @@
+# Coroutine counterparts of dj.wrapper.{artist,track,recommender,playlist,genre}.
+# Needs the "aio" extra (aiohttp). Run inside one event loop and await
+# dj.wrapper.aio.connection.close() before it ends.
@@ -0,0 +1,61 @@
+import asyncio
+from typing import List, Optional
+
+from dj.data import Artist
+from dj.log_setup import get_logger
+from ..artist import ARTISTS_BATCH_SIZE
+from ..util import batch, id_from_uri
+from .cache import cache
+from .connection import spotify
+from .track import build_preliminary_tracklist
+from .util import find, search
+
+logger = get_logger(__name__)
+
+
+async def search_artist_id_by_name(query: str):
+    s = await search(query, "artist")
+    return s["id"]
+
+
+async def find_an_artist_by_name(query: str):
+    return await find(query, "artist")
+
+
+async def build_artist(uri: str) -> Optional[Artist]:
+    return (await build_artists([uri]))[0]
+
+
+async def build_artists(uris: List[str]) -> List[Optional[Artist]]:
+    # One entry per input URI, in order (None if Spotify doesn't know it); each
+    # distinct artist is fetched once
+    ids = [id_from_uri(uri) for uri in uris]
+    artists = await cache.get_many("artist", ids)
+    missing = list(dict.fromkeys(i for i in ids if i not in artists))
+
+    async def fetch(chunk):
+        fetched = {
+            a["id"]: {k: a[k] for k in ("name", "id", "genres")}
+            for a in (await spotify.artists(list(chunk)))["artists"]
+            if a
+        }
+        await cache.set_many("artist", fetched)
+        artists.update(fetched)
+
+    await asyncio.gather(*(fetch(c) for c in batch(missing, ARTISTS_BATCH_SIZE)))
+
+    return [Artist(**artists[i]) if i in artists else None for i in ids]
+
+
+async def get_top_tracks_per_artist(artist_uri: str, allow_explicit=False):
+    top_tracks = (await spotify.artist_top_tracks(id_from_uri(artist_uri)))["tracks"]
+    return await build_preliminary_tracklist(top_tracks, allow_explicit)
+
+
+async def get_related_artists(artist_id: str) -> List[Artist]:
+    related = [
+        Artist(name=a["name"], id=a["id"], genres=a["genres"])
+        for a in (await spotify.artist_related_artists(artist_id))["artists"]
+    ]
+    logger.debug("%d related artists for %s", len(related), artist_id)
+    return related
@@ -0,0 +1,26 @@
+import asyncio
+from typing import Any, Dict, Iterable
+
+from ..cache import MetadataCache, cache as sync_cache
+
+
+class AsyncMetadataCache:
+    # The shared SQLite metadata cache with every read and write run on a worker
+    # thread, so a disk round trip never stalls the requests on the event loop
+    def __init__(self, store: MetadataCache):
+        self.store = store
+
+    async def get(self, entity: str, key: str) -> Any:
+        return await asyncio.to_thread(self.store.get, entity, key)
+
+    async def get_many(self, entity: str, keys: Iterable[str]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.store.get_many, entity, list(keys))
+
+    async def set(self, entity: str, key: str, value: Any):
+        await asyncio.to_thread(self.store.set, entity, key, value)
+
+    async def set_many(self, entity: str, values: Dict[str, Any]):
+        await asyncio.to_thread(self.store.set_many, entity, values)
+
+
+cache = AsyncMetadataCache(sync_cache)
@@ -0,0 +1,323 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+try:
+    import aiohttp
+except ImportError as e:  # optional dependency
+    raise ImportError(
+        "dj.wrapper.aio needs aiohttp; install it with: pip install 'spotify-dj[aio]'"
+    ) from e
+from spotipy import SpotifyException
+
+from dj.log_setup import get_logger
+from ..connection import RETRYABLE_STATUS_CODES, scope
+from ..metrics import metrics
+from ..scheduler import DEFAULT_MAX_RETRIES, RATE_LIMITED, retry_after
+from ..transport import RETRYABLE_METHODS, transport_settings
+from ..util import id_from_uri
+
+logger = get_logger(__name__)
+
+API_PREFIX = "https://api.spotify.com/v1/"
+DEFAULT_MAX_IN_FLIGHT = 100
+UNAUTHORIZED = 401
+
+
+def _ids(items: List[str]) -> str:
+    return ",".join(id_from_uri(i) for i in items)
+
+
+class AsyncSpotify:
+    # The subset of spotipy.Spotify that dj.wrapper uses, as coroutines over one
+    # pooled aiohttp session. A semaphore caps requests in flight; a 429 pauses
+    # every request on this client for Retry-After, like RequestScheduler does.
+    def __init__(
+        self, prefix: Optional[str] = None, max_in_flight: Optional[int] = None
+    ):
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        self.local = prefix is not None or bool(os.getenv("DJ_API_PREFIX"))
+        self.prefix = prefix or os.getenv("DJ_API_PREFIX") or API_PREFIX
+        self.max_in_flight = max_in_flight or int(
+            os.getenv("DJ_AIO_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)
+        )
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._auth_manager: Any = None  # spotipy SpotifyOAuth, built on first use
+        self._token: Optional[str] = None
+        self._paused_until = 0.0
+
+    async def __aenter__(self) -> "AsyncSpotify":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _client_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            settings = transport_settings()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_in_flight, ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=settings.connect_timeout,
+                    sock_read=settings.read_timeout,
+                ),
+            )
+        return self._session
+
+    async def _access_token(self, refresh: bool = False) -> str:
+        if self._token is not None and not refresh:
+            return self._token
+        if self.local:
+            # Local stand-in API (benchmarks/fake_spotify.py); no OAuth
+            token = os.getenv("DJ_ACCESS_TOKEN", "local")
+        else:
+            if self._auth_manager is None:
+                from spotipy.oauth2 import SpotifyOAuth
+
+                self._auth_manager = SpotifyOAuth(scope=scope)
+            # Token cache file and refresh are blocking; keep them off the loop
+            token = await asyncio.to_thread(
+                self._auth_manager.get_access_token, as_dict=False
+            )
+        self._token = token
+        return token
+
+    async def _wait_if_paused(self):
+        while (pause := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(pause)
+
+    async def _request(
+        self,
+        endpoint: str,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        payload: Any = None,
+    ) -> Any:
+        if not url.startswith("http"):
+            url = self.prefix + url
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+
+        for attempt in itertools.count():
+            await self._wait_if_paused()
+            async with self._semaphore:
+                headers = {"Authorization": f"Bearer {await self._access_token()}"}
+                start = time.perf_counter()
+                try:
+                    async with self._client_session().request(
+                        method, url, params=params, json=payload, headers=headers
+                    ) as response:
+                        body = await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    metrics.observe_call(
+                        endpoint, time.perf_counter() - start, error=True
+                    )
+                    raise
+                status = response.status
+                metrics.observe_call(
+                    endpoint,
+                    time.perf_counter() - start,
+                    error=status >= 400,
+                    response_bytes=len(body),
+                )
+
+            if status < 400:
+                return json.loads(body) if body else None
+            if status == UNAUTHORIZED and attempt == 0:
+                await self._access_token(refresh=True)
+                continue
+            # 429s are never applied, so any method may retry them; a 5xx only
+            # for the idempotent ones, as in the sync session
+            retryable = status == RATE_LIMITED or (
+                status in RETRYABLE_STATUS_CODES and method in RETRYABLE_METHODS
+            )
+            if retryable and attempt < DEFAULT_MAX_RETRIES:
+                delay = retry_after(response.headers, attempt)
+                if status == RATE_LIMITED:
+                    logger.warning(
+                        "Rate limited on %s; retrying in %.1fs", endpoint, delay
+                    )
+                    metrics.record_retry(endpoint)
+                    self._paused_until = max(
+                        self._paused_until, time.monotonic() + delay
+                    )
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            raise SpotifyException(
+                status,
+                -1,
+                f"{url}:\n {body.decode(errors='replace')}",
+                headers=dict(response.headers),
+            )
+
+    async def _get(self, endpoint: str, url: str, **params) -> Any:
+        return await self._request(endpoint, "GET", url, params=params)
+
+    async def next(self, page: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._get("next", page["next"]) if page.get("next") else None
+
+    async def artist(self, artist_id: str):
+        return await self._get("artist", f"artists/{id_from_uri(artist_id)}")
+
+    async def artists(self, artist_ids: List[str]):
+        return await self._get("artists", "artists", ids=_ids(artist_ids))
+
+    async def artist_albums(self, artist_id: str, limit: int = 20, offset: int = 0):
+        return await self._get(
+            "artist_albums",
+            f"artists/{id_from_uri(artist_id)}/albums",
+            limit=limit,
+            offset=offset,
+        )
+
+    async def artist_top_tracks(self, artist_id: str, country: str = "US"):
+        return await self._get(
+            "artist_top_tracks",
+            f"artists/{id_from_uri(artist_id)}/top-tracks",
+            country=country,
+        )
+
+    async def artist_related_artists(self, artist_id: str):
+        return await self._get(
+            "artist_related_artists",
+            f"artists/{id_from_uri(artist_id)}/related-artists",
+        )
+
+    async def album_tracks(self, album_id: str, limit: int = 50, offset: int = 0):
+        return await self._get(
+            "album_tracks",
+            f"albums/{id_from_uri(album_id)}/tracks",
+            limit=limit,
+            offset=offset,
+        )
+
+    async def track(self, track_id: str):
+        return await self._get("track", f"tracks/{id_from_uri(track_id)}")
+
+    async def tracks(self, track_ids: List[str]):
+        return await self._get("tracks", "tracks", ids=_ids(track_ids))
+
+    async def audio_features(self, track_ids: List[str]):
+        results = await self._get(
+            "audio_features", "audio-features", ids=_ids(track_ids)
+        )
+        return results["audio_features"] if results else []
+
+    async def recommendations(
+        self,
+        seed_artists: Optional[List[str]] = None,
+        seed_genres: Optional[List[str]] = None,
+        seed_tracks: Optional[List[str]] = None,
+        limit: int = 20,
+    ):
+        return await self._get(
+            "recommendations",
+            "recommendations",
+            seed_artists=_ids(seed_artists) if seed_artists else None,
+            seed_genres=",".join(seed_genres) if seed_genres else None,
+            seed_tracks=_ids(seed_tracks) if seed_tracks else None,
+            limit=limit,
+        )
+
+    async def recommendation_genre_seeds(self):
+        return await self._get(
+            "recommendation_genre_seeds", "recommendations/available-genre-seeds"
+        )
+
+    async def search(self, q: str, limit: int = 10, offset: int = 0, type="track"):
+        return await self._get(
+            "search", "search", q=q, limit=limit, offset=offset, type=type
+        )
+
+    async def playlist(self, playlist_id: str, fields: Optional[str] = None):
+        return await self._get(
+            "playlist", f"playlists/{id_from_uri(playlist_id)}", fields=fields
+        )
+
+    async def playlist_tracks(
+        self,
+        playlist_id: str,
+        fields: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ):
+        return await self._get(
+            "playlist_tracks",
+            f"playlists/{id_from_uri(playlist_id)}/items",
+            fields=fields,
+            limit=limit,
+            offset=offset,
+        )
+
+    async def playlist_add_items(
+        self, playlist_id: str, items: List[str], position: Optional[int] = None
+    ):
+        payload: Dict[str, Any] = {"uris": items}
+        if position is not None:
+            payload["position"] = position
+        return await self._request(
+            "playlist_add_items",
+            "POST",
+            f"playlists/{id_from_uri(playlist_id)}/items",
+            payload=payload,
+        )
+
+    async def user_playlists(self, user: str, limit: int = 50, offset: int = 0):
+        return await self._get(
+            "user_playlists", f"users/{user}/playlists", limit=limit, offset=offset
+        )
+
+    async def user_playlist_create(
+        self, user: str, name: str, public: bool = True, description: str = ""
+    ):
+        return await self._request(
+            "user_playlist_create",
+            "POST",
+            f"users/{user}/playlists",
+            payload={"name": name, "public": public, "description": description},
+        )
+
+
+# One client per event loop: aiohttp sessions can't be shared across loops
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncSpotify]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_spotify() -> AsyncSpotify:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncSpotify()
+    return client
+
+
+async def close():
+    # Call before the loop ends, e.g. at the bottom of the coroutine passed to
+    # asyncio.run, so the connection pool shuts down cleanly
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+class LazySpotify:
+    def __getattr__(self, name: str):
+        return getattr(get_spotify(), name)
+
+
+spotify = LazySpotify()
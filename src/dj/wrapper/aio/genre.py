@@ -0,0 +1,25 @@
+import asyncio
+from typing import List
+
+from dj.log_setup import get_logger
+from .artist import search_artist_id_by_name
+from .connection import spotify
+from .recommender import build_recommended_tracklist, recommend
+
+logger = get_logger(__name__)
+
+
+async def list_genres():
+    official_genres = (await spotify.recommendation_genre_seeds())["genres"]
+    for g in official_genres:
+        logger.info("%s", g)
+    return official_genres
+
+
+async def recommend_from_official_genres(artists: List[str], genres: List[str]):
+    artist_ids = await asyncio.gather(
+        *(search_artist_id_by_name(x) for x in artists or [])
+    )
+    recs = await recommend(list(artist_ids), genres, track_ids=None)
+    track_analyses, _ = await build_recommended_tracklist(recs)
+    return track_analyses
@@ -0,0 +1,119 @@
+from typing import Dict, Optional, Sequence
+
+from dj.log_setup import get_logger
+from ..cache import MISSING
+from ..playlist import PlaylistNames, user_id_from_env
+from ..playlist_writer import PLAYLIST_WRITE_BATCH_SIZE
+from ..util import batch
+from .cache import cache
+from .connection import spotify
+from .genre import recommend_from_official_genres
+from .util import collect
+
+logger = get_logger(__name__)
+
+
+class AsyncPlaylistDirectory:
+    # The sync PlaylistDirectory with awaited I/O; same names, cache entry and
+    # refresh rule
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.names = PlaylistNames(user_id)
+
+    async def _fetch(self):
+        playlists = await collect(await spotify.user_playlists(self.user_id, limit=50))
+        ids = self.names.index(playlists)
+        await cache.set(PlaylistNames.ENTITY, self.user_id, ids)
+
+    async def _load(self):
+        if not self.names.loaded:
+            stored = await cache.get(PlaylistNames.ENTITY, self.user_id)
+            if stored is MISSING:
+                await self._fetch()
+            else:
+                self.names.load(stored)
+
+    async def get(self, playlist_name: str) -> str:
+        await self._load()
+        if self.names.needs_refresh(playlist_name):
+            await self._fetch()
+        return self.names.lookup(playlist_name)
+
+    async def add(self, playlist_name: str, playlist_id: str):
+        await self._load()
+        ids = self.names.add(playlist_name, playlist_id)
+        await cache.set(PlaylistNames.ENTITY, self.user_id, ids)
+
+
+_playlist_directories: Dict[str, AsyncPlaylistDirectory] = {}
+
+
+def playlist_directory(user_id: str) -> AsyncPlaylistDirectory:
+    return _playlist_directories.setdefault(user_id, AsyncPlaylistDirectory(user_id))
+
+
+async def get_user_playlist_id_from_playlist_name(
+    user_id: str, playlist_name: str
+) -> str:
+    return await playlist_directory(user_id).get(playlist_name)
+
+
+async def add_track_uris(
+    playlist_id: str, track_uris: Sequence[str], position: Optional[int] = None
+) -> Optional[str]:
+    # Chunks go out one after another so the playlist keeps the given order
+    snapshot_id = None
+    for i, chunk in enumerate(batch(track_uris, PLAYLIST_WRITE_BATCH_SIZE)):
+        chunk_position = (
+            None if position is None else position + i * PLAYLIST_WRITE_BATCH_SIZE
+        )
+        result = await spotify.playlist_add_items(
+            playlist_id, list(chunk), position=chunk_position
+        )
+        snapshot_id = result["snapshot_id"]
+    return snapshot_id
+
+
+async def add_recommended_tracks_to_playlist(
+    user_id, artist_names, genres, playlist_id
+):
+    logger.info("Playlist ID: %s", playlist_id)
+    new_tracks = await recommend_from_official_genres(artist_names, genres)
+    await add_track_uris(playlist_id, [t.track.uri for t in new_tracks if t])
+
+
+async def add_track_uris_to_existing_playlist_name(
+    username: str, playlist_name: str, track_uris
+):
+    if len(track_uris):
+        logger.info("Adding %d songs to playlist", len(track_uris))
+        user_id = user_id_from_env(username)
+        playlist_id = await get_user_playlist_id_from_playlist_name(
+            user_id, playlist_name
+        )
+        await add_track_uris(playlist_id, track_uris)
+
+
+async def create_new_playlist(
+    username: str, playlist_name: str, description: str, artist_names, genres
+):
+    user_id = user_id_from_env(username)
+    new_playlist = await spotify.user_playlist_create(
+        user_id, playlist_name, description=description
+    )
+    await playlist_directory(user_id).add(playlist_name, new_playlist["id"])
+    await add_recommended_tracks_to_playlist(
+        user_id, artist_names, genres, new_playlist["id"]
+    )
+
+    logger.info("Finished creating playlist '%s'", playlist_name)
+
+
+async def add_to_existing_playlist(
+    username: str, playlist_name: str, artist_names, genres
+):
+    user_id = user_id_from_env(username)
+    playlist_id = await get_user_playlist_id_from_playlist_name(user_id, playlist_name)
+    await add_recommended_tracks_to_playlist(user_id, artist_names, genres, playlist_id)
+
+    logger.info("Added new songs to playlist '%s'", playlist_name)
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from dj.data import Artist, TrackAnalysis
+from ..track import build_track
+from .artist import build_artists
+from .connection import spotify
+from .track import build_track_analyses
+
+
+async def recommend(
+    artist_ids: Optional[List[str]],
+    genres: Optional[List[str]],
+    track_ids: Optional[List[str]],
+    limit: int = 20,
+):
+    return await spotify.recommendations(
+        seed_artists=artist_ids,
+        seed_genres=genres,
+        seed_tracks=track_ids,
+        limit=limit,
+    )
+
+
+async def build_recommended_tracklist(
+    recs: Dict[str, Any],
+) -> Tuple[List[Optional[TrackAnalysis]], List[Optional[Artist]]]:
+    # Artists and audio features are independent, so both go out together
+    tracks = [build_track(rec) for rec in recs["tracks"]]
+    track_analyses, artists = await asyncio.gather(
+        build_track_analyses(tracks),
+        build_artists([rec["artists"][0]["uri"] for rec in recs["tracks"]]),
+    )
+    return track_analyses, artists
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from dj.data import Album, Artist, AudioFeatures, Track, TrackAnalysis
+from dj.log_setup import get_logger
+from ..track import AUDIO_FEATURES_BATCH_SIZE, build_track
+from ..util import batch
+from .cache import cache
+from .connection import spotify
+from .util import cached, collect
+
+logger = get_logger(__name__)
+
+
+async def get_track_by_uri(uri: str):
+    return await spotify.track(uri)
+
+
+async def get_artist_albums(artist_id: str) -> List[Dict[str, Any]]:
+    async def fetch():
+        albums = await collect(await spotify.artist_albums(artist_id, limit=50))
+        return [{"id": a["id"], "name": a["name"], "uri": a["uri"]} for a in albums]
+
+    return await cached("artist_albums", artist_id, fetch)
+
+
+async def get_album_tracks(album_uri: str) -> List[Dict[str, Any]]:
+    async def fetch():
+        tracks = await collect(await spotify.album_tracks(album_uri, limit=50))
+        return [
+            {"name": t["name"], "uri": t["uri"], "explicit": t["explicit"]}
+            for t in tracks
+        ]
+
+    return await cached("album_tracks", album_uri, fetch)
+
+
+async def build_track_analysis(track: Track) -> Optional[TrackAnalysis]:
+    return (await build_track_analyses([track]))[0]
+
+
+async def build_track_analyses(tracks: List[Track]) -> List[Optional[TrackAnalysis]]:
+    # Like the sync version, but every 100-URI batch is requested at once
+    uris = [t.uri for t in tracks]
+    features = await cache.get_many("audio_features", uris)
+    missing = list(dict.fromkeys(u for u in uris if u not in features))
+
+    async def fetch(chunk):
+        fetched = await spotify.audio_features(list(chunk)) or []
+        fetched += [None] * (len(chunk) - len(fetched))
+        fetched_by_uri = dict(zip(chunk, fetched))
+        await cache.set_many(
+            "audio_features", {u: f for u, f in fetched_by_uri.items() if f}
+        )
+        features.update(fetched_by_uri)
+
+    await asyncio.gather(
+        *(fetch(chunk) for chunk in batch(missing, AUDIO_FEATURES_BATCH_SIZE))
+    )
+
+    return [
+        (
+            TrackAnalysis(track=track, analysis=AudioFeatures(**feature))
+            if (feature := features.get(track.uri))
+            else None
+        )
+        for track in tracks
+    ]
+
+
+async def get_album_track_analyses(album: Album) -> List[Optional[TrackAnalysis]]:
+    logger.debug("Collecting tracks from %s", album.name)
+    tracks = [build_track(t) for t in await get_album_tracks(album.uri)]
+    return await build_track_analyses(tracks)
+
+
+async def get_all_tracks(artist: Artist, limit=None) -> List[TrackAnalysis]:
+    albums = [Album(**a) for a in await get_artist_albums(artist.id)]
+    if limit:
+        albums = albums[0:limit]
+
+    # All albums at once; the client's semaphore bounds what is actually in flight
+    per_album = await asyncio.gather(*(get_album_track_analyses(a) for a in albums))
+    return [ta for analyses in per_album for ta in analyses if ta]
+
+
+async def build_preliminary_tracklist(
+    spotify_tracks: List[Dict[str, Any]], allow_explicit=False
+) -> List[Optional[TrackAnalysis]]:
+    return await build_track_analyses([build_track(t) for t in spotify_tracks])
@@ -0,0 +1,38 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from ..cache import MISSING
+from .cache import cache
+from .connection import spotify
+
+
+async def paginate(page: Optional[Dict[str, Any]]) -> AsyncIterator[Any]:
+    while page:
+        for item in page["items"]:
+            yield item
+        page = await spotify.next(page)
+
+
+async def collect(page: Optional[Dict[str, Any]]) -> list:
+    return [item async for item in paginate(page)]
+
+
+async def cached(entity: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    # Same entries as the sync wrappers, so either side warms the other
+    value = await cache.get(entity, key)
+    if value is MISSING:
+        value = await fetch()
+        await cache.set(entity, key, value)
+    return value
+
+
+async def search(query: str, type_: str):
+    s = await spotify.search(query, type=type_, limit=1)
+
+    for item in s[f"{type_}s"]["items"]:
+        return item
+
+
+async def find(query: str, type_: str):
+    s = await spotify.search(query, type=type_, limit=10)
+
+    return s[f"{type_}s"]["items"]
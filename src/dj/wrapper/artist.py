@@ -1,13 +1,17 @@
-from typing import List
+from typing import List, Optional
 
 from dj.data import Artist
 from dj.log_setup import get_logger
+from .cache import cache
 from .connection import spotify
+from .memo import single_flight
 from .track import build_preliminary_tracklist
-from .util import find, search
+from .util import batch, find, id_from_uri, search
 
 logger = get_logger(__name__)
 
+ARTISTS_BATCH_SIZE = 50  # API maximum for /artists?ids=
+
 
 def search_artist_id_by_name(query: str):
     s = search(query, "artist")
@@ -19,15 +23,44 @@ def find_an_artist_by_name(query: str):
     return f
 
 
+@single_flight(key=id_from_uri)
 def build_artist(uri: str) -> Artist:
-    artist = spotify.artist(uri)
+    artist_id = id_from_uri(uri)
+    artist = cache.cached(
+        "artist",
+        artist_id,
+        lambda: {
+            k: v
+            for k, v in spotify.artist(artist_id).items()
+            if k in ("name", "id", "genres")
+        },
+    )
     logger.info("===== Current Artist: %s", artist["name"])
     return Artist(name=artist["name"], id=artist["id"], genres=artist["genres"])
 
 
+def build_artists(uris: List[str]) -> List[Optional[Artist]]:
+    # One entry per URI, in order (None if Spotify doesn't know it). Cached
+    # artists cost nothing; the rest go out 50 IDs per request.
+    ids = [id_from_uri(uri) for uri in uris]
+    artists = cache.get_many("artist", ids)
+    missing = list(dict.fromkeys(i for i in ids if i not in artists))
+
+    for chunk in batch(missing, ARTISTS_BATCH_SIZE):
+        fetched = {
+            a["id"]: {k: a[k] for k in ("name", "id", "genres")}
+            for a in spotify.artists(list(chunk))["artists"]
+            if a
+        }
+        cache.set_many("artist", fetched)
+        artists.update(fetched)
+    logger.debug("Built %d artists, %d fetched", len(ids), len(missing))
+
+    return [Artist(**artists[i]) if i in artists else None for i in ids]
+
+
 def get_top_tracks_per_artist(artist_uri: str, allow_explicit=False):
-    artist = spotify.artist(artist_uri)
-    top_tracks = spotify.artist_top_tracks(artist["id"])["tracks"]
+    top_tracks = spotify.artist_top_tracks(id_from_uri(artist_uri))["tracks"]
     return build_preliminary_tracklist(top_tracks, allow_explicit)
 
 
@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from dj.log_setup import get_logger
+from .metrics import metrics
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "spotify-dj" / "cache.sqlite"
+
+# Seconds until an entry goes stale; None never expires.
+# Audio features are fixed per track URI, artist metadata drifts slowly.
+ENTITY_TTLS: Dict[str, Optional[int]] = {
+    "artist": 7 * 24 * 3600,
+    "artist_albums": 24 * 3600,
+    "album_tracks": 30 * 24 * 3600,
+    "audio_features": None,
+    "playlist_index": 30 * 24 * 3600,  # keyed by snapshot_id, so only ages out
+    "playlist_directory": 3600,
+}
+MAX_ENTRIES = 250_000
+EVICT_EVERY_N_WRITES = 1_000
+
+MISSING = object()
+
+
+class MetadataCache:
+    def __init__(
+        self,
+        path: Path,
+        ttls: Dict[str, Optional[int]] = ENTITY_TTLS,
+        max_entries: int = MAX_ENTRIES,
+    ):
+        self.path = Path(path)
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.enabled = True
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " entity TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (entity, key))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)"
+            )
+        return self._conn
+
+    def _expiry(self, entity: str, now: float) -> Optional[float]:
+        ttl = self.ttls.get(entity)
+        return None if ttl is None else now + ttl
+
+    def get(self, entity: str, key: str) -> Any:
+        return self.get_many(entity, [key]).get(key, MISSING)
+
+    def get_many(self, entity: str, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not self.enabled or not keys:
+            return {}
+
+        now = time.time()
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(keys), 500):  # stay under SQLite's variable limit
+                chunk = keys[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    "SELECT key, value FROM entries WHERE entity = ?"
+                    f" AND key IN ({placeholders})"
+                    " AND (expires_at IS NULL OR expires_at > ?)",
+                    [entity, *chunk, now],
+                ).fetchall()
+                found.update({k: json.loads(v) for k, v in rows})
+            if found:
+                conn.executemany(
+                    "UPDATE entries SET accessed_at = ? WHERE entity = ? AND key = ?",
+                    [(now, entity, k) for k in found],
+                )
+                conn.commit()
+        metrics.record_cache(entity, len(found), len(keys) - len(found))
+        return found
+
+    def set(self, entity: str, key: str, value: Any):
+        self.set_many(entity, {key: value})
+
+    def set_many(self, entity: str, values: Dict[str, Any]):
+        if not self.enabled or not values:
+            return
+
+        now = time.time()
+        expires_at = self._expiry(entity, now)
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries"
+                " (entity, key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (entity, k, json.dumps(v), expires_at, now)
+                    for k, v in values.items()
+                ],
+            )
+            conn.commit()
+            self._writes += len(values)
+            if self._writes >= EVICT_EVERY_N_WRITES:
+                self._writes = 0
+                self.evict()
+
+    def cached(self, entity: str, key: str, fetch: Callable[[], Any]) -> Any:
+        value = self.get(entity, key)
+        if value is MISSING:
+            value = fetch()
+            self.set(entity, key, value)
+        return value
+
+    def evict(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (time.time(),),
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM entries WHERE rowid IN ("
+                    " SELECT rowid FROM entries ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                logger.debug("Evicted %d cache entries", count - self.max_entries)
+            conn.commit()
+
+    def purge(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+        logger.info("Purged metadata cache at %s", self.path)
+
+
+cache = MetadataCache(Path(os.getenv("DJ_CACHE_PATH", DEFAULT_CACHE_PATH)))
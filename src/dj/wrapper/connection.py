@@ -1,9 +1,61 @@
-import spotipy
-from dotenv import load_dotenv
+import os
+import threading
+from typing import Optional
 
-from spotipy.oauth2 import SpotifyOAuth
+from .metrics import metrics
+from .scheduler import DEFAULT_RATE, RequestScheduler, ScheduledSpotify
+from .transport import build_session, transport_settings
 
-load_dotenv()
+# 429s are left to the scheduler (see build_session), which honours Retry-After
+# and slows its token bucket down
+RETRYABLE_STATUS_CODES = (500, 502, 503, 504)
 
 scope = "user-library-read playlist-modify-public playlist-modify-private"
-spotify = spotipy.Spotify(auth_manager=SpotifyOAuth(scope=scope))
+
+_client: Optional[ScheduledSpotify] = None
+_client_lock = threading.Lock()
+
+
+def get_spotify() -> ScheduledSpotify:
+    # spotipy, .env and OAuth are only touched by the first real API call, so
+    # `-h`, argument errors and offline subcommands start fast
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import spotipy
+                from dotenv import load_dotenv
+                from spotipy.oauth2 import SpotifyOAuth
+
+                load_dotenv()
+                settings = transport_settings()
+                scheduler = RequestScheduler(
+                    rate=float(os.getenv("DJ_RATE_LIMIT", DEFAULT_RATE)),
+                    max_in_flight=settings.pool_size,
+                )
+                transport = dict(
+                    requests_session=build_session(settings, RETRYABLE_STATUS_CODES),
+                    requests_timeout=settings.timeout,
+                )
+                if api_prefix := os.getenv("DJ_API_PREFIX"):
+                    # Local stand-in API (benchmarks/fake_spotify.py); no OAuth
+                    client = spotipy.Spotify(
+                        auth=os.getenv("DJ_ACCESS_TOKEN", "local"), **transport
+                    )
+                    client.prefix = api_prefix
+                else:
+                    client = spotipy.Spotify(
+                        auth_manager=SpotifyOAuth(scope=scope), **transport
+                    )
+                client._session.hooks["response"].append(metrics.count_response_bytes)
+                _client = ScheduledSpotify(client, scheduler)
+    return _client
+
+
+class LazySpotify:
+    # Process-wide handle; `from .connection import spotify` stays import-cheap
+    def __getattr__(self, name: str):
+        return getattr(get_spotify(), name)
+
+
+spotify = LazySpotify()
@@ -0,0 +1,117 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from dj.data import Artist
+from dj.log_setup import get_logger
+from .connection import spotify
+
+logger = get_logger(__name__)
+
+DEFAULT_DEPTH = 1
+DEFAULT_WORKERS = 4
+
+
+def fetch_related_artists(artist_id: str) -> List[Artist]:
+    # The related payload already carries name/id/genres; no build_artist needed
+    return [
+        Artist(name=a["name"], id=a["id"], genres=a["genres"])
+        for a in spotify.artist_related_artists(artist_id)["artists"]
+    ]
+
+
+class RelatedArtistCrawler:
+    # Breadth-first walk of the related-artist graph. Every expanded artist is
+    # appended to the journal (JSON lines) with its neighbours, and so is every
+    # artist the caller reports finished (mark_done), so a rerun with the same
+    # journal neither refetches neighbours nor yields those artists again.
+    def __init__(self, journal: Optional[Path] = None, workers: int = DEFAULT_WORKERS):
+        self.journal = Path(journal) if journal else None
+        self.workers = max(workers, 1)
+        self.artists: Dict[str, Artist] = {}
+        self.related: Dict[str, List[str]] = {}
+        self.done: Set[str] = set()
+        self._journal_lock = threading.Lock()
+        self._load_journal()
+
+    def _load_journal(self):
+        if not (self.journal and self.journal.exists()):
+            return
+        offset = 0
+        for number, line in enumerate(
+            self.journal.read_bytes().splitlines(keepends=True), start=1
+        ):
+            if not line.endswith(b"\n"):
+                # Cut off mid-write, so only ever the last line. Drop it so the
+                # next append starts on a line of its own.
+                logger.warning("Dropping unfinished last line of %s", self.journal)
+                with open(self.journal, "r+b") as fh:
+                    fh.truncate(offset)
+                break
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.warning("Skipping malformed line %d of %s", number, self.journal)
+                continue
+            if "done" in entry:
+                self.done.add(entry["done"])
+                continue
+            for a in [entry["artist"]] + entry["related"]:
+                self.artists[a["id"]] = Artist(**a)
+            self.related[entry["artist"]["id"]] = [a["id"] for a in entry["related"]]
+        logger.info(
+            "Resuming crawl: %d artists already expanded, %d finished (%s)",
+            len(self.related),
+            len(self.done),
+            self.journal,
+        )
+
+    def _append(self, entry: Dict[str, Any]):
+        if self.journal:
+            with self._journal_lock, open(self.journal, "a") as fh:
+                fh.write(json.dumps(entry) + "\n")
+
+    def _record(self, artist: Artist, related: List[Artist]):
+        self.related[artist.id] = [r.id for r in related]
+        for r in related:
+            self.artists.setdefault(r.id, r)
+        self._append({"artist": vars(artist), "related": [vars(r) for r in related]})
+
+    def mark_done(self, artist: Artist):
+        # Called once the caller has finished with an artist crawl() yielded
+        self.done.add(artist.id)
+        self._append({"done": artist.id})
+
+    def _expand(self, frontier: List[Artist]):
+        pending = [a for a in frontier if a.id not in self.related]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for artist, related in zip(
+                pending, executor.map(lambda a: fetch_related_artists(a.id), pending)
+            ):
+                self._record(artist, related)
+
+    def crawl(self, seed: Artist, depth: int = DEFAULT_DEPTH) -> Iterator[Artist]:
+        # Yields each artist once, seed first, then level by level. Artists
+        # marked done on an earlier run are still walked through, not yielded.
+        self.artists.setdefault(seed.id, seed)
+        visited = {seed.id}
+        frontier = [seed]
+        if seed.id not in self.done:
+            yield seed
+
+        for level in range(1, depth + 1):
+            self._expand(frontier)
+            next_frontier = []
+            for artist in frontier:
+                for related_id in self.related[artist.id]:
+                    if related_id not in visited:
+                        visited.add(related_id)
+                        next_frontier.append(self.artists[related_id])
+            logger.info("Depth %d: %d new related artists", level, len(next_frontier))
+            yield from (a for a in next_frontier if a.id not in self.done)
+            frontier = next_frontier
@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Set
+
+from dj.data import Album, AudioFeatures, Track, TrackAnalysis
+from dj.log_setup import get_logger
+from .cache import DEFAULT_CACHE_PATH
+
+logger = get_logger(__name__)
+
+DEFAULT_DISCOGRAPHY_PATH = DEFAULT_CACHE_PATH.parent / "discography.sqlite"
+# The crawl that stores an album is the first; tracks still without features
+# after this many requests are not asked about again
+FEATURE_ATTEMPTS = 2
+
+
+class DiscographyStore:
+    # Durable record of every album we have crawled per artist, with its tracks
+    # and their audio features. Unlike the metadata cache nothing here expires
+    # or is evicted: an album's track list and features don't change, so an
+    # incremental crawl only has to ask Spotify about albums not in here.
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS albums ("
+                " artist_id TEXT NOT NULL,"
+                " album_id TEXT NOT NULL,"
+                " name TEXT NOT NULL,"
+                " uri TEXT NOT NULL,"
+                " synced_at REAL NOT NULL,"
+                " PRIMARY KEY (artist_id, album_id));"
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                " album_id TEXT NOT NULL,"
+                " position INTEGER NOT NULL,"
+                " name TEXT NOT NULL,"
+                " uri TEXT NOT NULL,"
+                " explicit INTEGER NOT NULL,"
+                " features TEXT,"  # JSON; NULL while Spotify has none
+                " feature_attempts INTEGER NOT NULL,"
+                " PRIMARY KEY (album_id, position));"
+                "CREATE INDEX IF NOT EXISTS tracks_uri ON tracks (uri);"
+            )
+        return self._conn
+
+    def known_album_ids(self, artist_id: str) -> Set[str]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT album_id FROM albums WHERE artist_id = ?", (artist_id,)
+            )
+            return {album_id for (album_id,) in rows}
+
+    def album_track_analyses(self, album_id: str) -> List[Optional[TrackAnalysis]]:
+        # Same shape as get_album_track_analyses: None where features are missing
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT name, uri, explicit, features FROM tracks"
+                " WHERE album_id = ? ORDER BY position",
+                (album_id,),
+            )
+            stored = rows.fetchall()
+        return [
+            (
+                TrackAnalysis(
+                    track=Track(name=name, uri=uri, explicit=bool(explicit)),
+                    analysis=AudioFeatures(**json.loads(features)),
+                )
+                if features
+                else None
+            )
+            for name, uri, explicit, features in stored
+        ]
+
+    def missing_feature_tracks(self, album_id: str) -> List[Track]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT name, uri, explicit FROM tracks"
+                " WHERE album_id = ? AND features IS NULL AND feature_attempts < ?"
+                " ORDER BY position",
+                (album_id, FEATURE_ATTEMPTS),
+            )
+            return [Track(name=n, uri=u, explicit=bool(e)) for n, u, e in rows]
+
+    def save_album(
+        self,
+        artist_id: str,
+        album: Album,
+        tracks: List[Track],
+        analyses: List[Optional[TrackAnalysis]],
+    ):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO albums VALUES (?, ?, ?, ?, ?)",
+                (artist_id, album.id, album.name, album.uri, time.time()),
+            )
+            conn.execute("DELETE FROM tracks WHERE album_id = ?", (album.id,))
+            conn.executemany(
+                "INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, 1)",
+                [
+                    (
+                        album.id,
+                        position,
+                        track.name,
+                        track.uri,
+                        int(track.explicit),
+                        json.dumps(vars(analysis.analysis)) if analysis else None,
+                    )
+                    for position, (track, analysis) in enumerate(zip(tracks, analyses))
+                ],
+            )
+            conn.commit()
+
+    def record_feature_attempt(self, tracks: List[Track]):
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "UPDATE tracks SET feature_attempts = feature_attempts + 1"
+                " WHERE uri = ? AND features IS NULL",
+                [(track.uri,) for track in tracks],
+            )
+            conn.commit()
+
+    def update_features(self, analyses: List[TrackAnalysis]):
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "UPDATE tracks SET features = ? WHERE uri = ?",
+                [(json.dumps(vars(ta.analysis)), ta.track.uri) for ta in analyses],
+            )
+            conn.commit()
+
+
+discography = DiscographyStore(
+    Path(os.getenv("DJ_DISCOGRAPHY_PATH", DEFAULT_DISCOGRAPHY_PATH))
+)
@@ -0,0 +1,57 @@
+import functools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    # Memoizes by key; concurrent callers for a key that is still being fetched
+    # wait on the first caller's result instead of issuing their own request.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results: Dict[Hashable, Any] = {}
+        self._in_flight: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+            leader = self._in_flight.get(key)
+            if leader is None:
+                future: Future = Future()
+                self._in_flight[key] = future
+
+        if leader is not None:
+            return leader.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._results[key] = result
+            del self._in_flight[key]
+        future.set_result(result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+def single_flight(key: Callable[..., Hashable]):
+    def decorator(fn):
+        flight = SingleFlight()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return flight.do(key(*args, **kwargs), lambda: fn(*args, **kwargs))
+
+        wrapper.cache_clear = flight.clear  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
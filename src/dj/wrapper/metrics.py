@@ -0,0 +1,213 @@
+import bisect
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from dj.log_setup import get_logger
+
+logger = get_logger(__name__)
+
+# Upper bounds in seconds; the implicit last bucket is +Inf
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_SUFFIXES = (".prom", ".txt")
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self) -> List[int]:
+        total, out = 0, []
+        for c in self.counts:
+            total += c
+            out.append(total)
+        return out
+
+
+class EndpointStats:
+    __slots__ = ("calls", "errors", "retries", "response_bytes", "wait", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.response_bytes = 0
+        self.wait = 0.0  # time queued in the scheduler / token bucket
+        self.latency = Histogram()
+
+    def as_dict(self) -> dict:
+        latency = self.latency
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "response_bytes": self.response_bytes,
+            "wait_seconds": round(self.wait, 6),
+            "latency_seconds": {
+                "sum": round(latency.sum, 6),
+                "mean": round(latency.sum / latency.count, 6) if latency.count else 0,
+                "max": round(latency.max, 6),
+                "buckets": {
+                    str(le): n
+                    for le, n in zip(
+                        list(latency.buckets) + ["+Inf"], latency.cumulative()
+                    )
+                },
+            },
+        }
+
+
+class MetricsRegistry:
+    # Process-wide counters for Spotify calls and the metadata cache. Response
+    # bytes arrive from a requests hook on the calling thread and are credited
+    # to whichever endpoint that thread is timing.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.endpoints: Dict[str, EndpointStats] = {}
+            self.cache: Dict[str, List[int]] = {}
+
+    def _endpoint(self, name: str) -> EndpointStats:
+        stats = self.endpoints.get(name)
+        if stats is None:
+            stats = self.endpoints[name] = EndpointStats()
+        return stats
+
+    def count_response_bytes(self, response, *args, **kwargs):
+        # requests response hook
+        self._local.pending_bytes = getattr(self._local, "pending_bytes", 0) + len(
+            response.content or b""
+        )
+
+    def observe_call(
+        self,
+        endpoint: str,
+        seconds: float,
+        error: bool = False,
+        response_bytes: int = 0,
+    ):
+        # Clients that don't go through requests pass response_bytes directly
+        pending = getattr(self._local, "pending_bytes", 0) + response_bytes
+        self._local.pending_bytes = 0
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats.calls += 1
+            stats.errors += error
+            stats.response_bytes += pending
+            stats.latency.observe(seconds)
+
+    def record_wait(self, endpoint: str, seconds: float):
+        with self._lock:
+            self._endpoint(endpoint).wait += seconds
+
+    def record_retry(self, endpoint: str):
+        with self._lock:
+            self._endpoint(endpoint).retries += 1
+
+    def record_cache(self, entity: str, hits: int, misses: int):
+        with self._lock:
+            counts = self.cache.setdefault(entity, [0, 0])
+            counts[0] += hits
+            counts[1] += misses
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            # Most expensive endpoints first
+            ranked = sorted(
+                self.endpoints.items(), key=lambda kv: kv[1].latency.sum, reverse=True
+            )
+            return {
+                "run_seconds": round(time.time() - self.started, 3),
+                "endpoints": {name: stats.as_dict() for name, stats in ranked},
+                "cache": {
+                    entity: {
+                        "hits": hits,
+                        "misses": misses,
+                        "hit_rate": (
+                            round(hits / (hits + misses), 4) if hits + misses else None
+                        ),
+                    }
+                    for entity, (hits, misses) in sorted(self.cache.items())
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            cache = sorted(self.cache.items())
+            run_seconds = time.time() - self.started
+
+            for field, name, help_text in (
+                ("calls", "dj_api_requests_total", "Spotify API calls"),
+                ("errors", "dj_api_errors_total", "Spotify API calls that raised"),
+                ("retries", "dj_api_retries_total", "Rate-limit retries"),
+                ("response_bytes", "dj_api_response_bytes_total", "Response bytes"),
+                ("wait", "dj_api_wait_seconds_total", "Time queued for a slot"),
+            ):
+                family(name, "counter", help_text)
+                for endpoint, stats in endpoints:
+                    value = getattr(stats, field)
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+
+            name = "dj_api_request_duration_seconds"
+            family(name, "histogram", "Spotify API call latency")
+            for endpoint, stats in endpoints:
+                latency = stats.latency
+                for le, n in zip(
+                    [str(b) for b in latency.buckets] + ["+Inf"], latency.cumulative()
+                ):
+                    lines.append(
+                        f'{name}_bucket{{endpoint="{endpoint}",le="{le}"}} {n}'
+                    )
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {latency.sum}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {latency.count}')
+
+            for index, name, help_text in (
+                (0, "dj_cache_hits_total", "Metadata cache hits"),
+                (1, "dj_cache_misses_total", "Metadata cache misses"),
+            ):
+                family(name, "counter", help_text)
+                for entity, counts in cache:
+                    lines.append(f'{name}{{entity="{entity}"}} {counts[index]}')
+
+        family("dj_run_duration_seconds", "gauge", "Wall time of the run")
+        lines.append(f"dj_run_duration_seconds {run_seconds}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # .prom/.txt get the Prometheus text format, anything else JSON
+        path = Path(path)
+        if path.suffix in PROMETHEUS_SUFFIXES:
+            path.write_text(self.to_prometheus())
+        else:
+            path.write_text(json.dumps(self.snapshot(), indent=2) + "\n")
+        calls = sum(stats.calls for stats in self.endpoints.values())
+        logger.info("Wrote metrics for %d API calls to %s", calls, path)
+
+
+metrics = MetricsRegistry()
@@ -1,17 +1,19 @@
 import csv
 import os
+from typing import Dict, Iterable, Set, Tuple
 
 from dj.log_setup import get_logger
+from dj.wrapper.cache import MISSING, cache
 from dj.wrapper.connection import spotify
 from dj.wrapper.genre import recommend_from_official_genres
-
+from dj.wrapper.playlist_writer import PlaylistWriter
+from dj.wrapper.util import paginate
 
 logger = get_logger(__name__)
 
 
 def get_official_spotify_playlist(playlist_id: str):
-    breakpoint()
-    for item in spotify.playlist(playlist_id)["tracks"]["items"]:
+    for item in paginate(spotify.playlist(playlist_id)["tracks"], prefetch=True):
         track = item["track"]
         main_artist = track["artists"][0]["name"]
         main_id = track["artists"][0]["id"]
@@ -21,32 +23,40 @@ def get_official_spotify_playlist(playlist_id: str):
         logger.debug("'%s' -- %s", track_name, main_artist)
 
 
+def user_id_from_env(username: str) -> str:
+    # CLIs take the name of an environment variable (e.g. from .env) holding the
+    # Spotify user ID, not the ID itself
+    user_id = os.getenv(username)
+    if user_id is None:
+        raise RuntimeError(f"Set {username} to a Spotify user ID, e.g. in .env")
+    return user_id
+
+
 def add_recommended_tracks_to_playlist(user_id, artist_names, genres, playlist_id):
     logger.info("Playlist ID: %s", playlist_id)
     new_tracks = recommend_from_official_genres(artist_names, genres)
-    track_uris = [t.track.uri for t in new_tracks]
-    spotify.user_playlist_add_tracks(user_id, playlist_id, track_uris)
+    track_uris = [t.track.uri for t in new_tracks if t]
+    PlaylistWriter(playlist_id).add(track_uris)
 
 
-def add_track_uris_to_existing_playlist_name(username: str, playlist_name: str, track_uris):
+def add_track_uris_to_existing_playlist_name(
+    username: str, playlist_name: str, track_uris
+):
     if len(track_uris):
         logger.info("Adding %d songs to playlist", len(track_uris))
-        user_id = os.getenv(username)
-        playlist_id = [
-            p["id"]
-            for p in spotify.user_playlists(user_id)["items"]
-            if p["name"] == playlist_name
-        ][0]
-        spotify.user_playlist_add_tracks(user_id, playlist_id, track_uris)
+        user_id = user_id_from_env(username)
+        playlist_id = get_user_playlist_id_from_playlist_name(user_id, playlist_name)
+        PlaylistWriter(playlist_id).add(track_uris)
 
 
 def create_new_playlist(
     username: str, playlist_name: str, description: str, artist_names, genres
 ):
-    user_id = os.getenv(username)
+    user_id = user_id_from_env(username)
     new_playlist = spotify.user_playlist_create(
         user_id, playlist_name, description=description
     )
+    playlist_directory(user_id).add(playlist_name, new_playlist["id"])
     add_recommended_tracks_to_playlist(
         user_id, artist_names, genres, new_playlist["id"]
     )
@@ -55,70 +65,186 @@ def create_new_playlist(
 
 
 def add_to_existing_playlist(username: str, playlist_name: str, artist_names, genres):
-    user_id = os.getenv(username)
-    playlist_id = [
-        p["id"]
-        for p in spotify.user_playlists(user_id)["items"]
-        if p["name"] == playlist_name
-    ][0]
+    user_id = user_id_from_env(username)
+    playlist_id = get_user_playlist_id_from_playlist_name(user_id, playlist_name)
     add_recommended_tracks_to_playlist(user_id, artist_names, genres, playlist_id)
 
     logger.info("Added new songs to playlist '%s'", playlist_name)
 
 
 def get_user_playlists(username: str):
-    playlists = spotify.current_user_saved_tracks()
+    playlists = spotify.current_user_saved_tracks(limit=50)
     logger.debug("Playlist Count: %s", playlists["total"])
-    return playlists
+    return paginate(playlists, prefetch=True)
 
 
-def get_user_playlist_id_from_playlist_name(playlist_name: str):
-    # playlists = get_user_playlists(user)
-    # for playlist in playlists["items"]:
-    #     if playlist["name"] == playlist_name:
-    #         breakpoint()
-    pass
+class PlaylistNames:
+    # Playlist name -> ID for one user, plus the rule both the sync and async
+    # directories follow: a name we don't know triggers one refresh per run.
+    ENTITY = "playlist_directory"  # metadata cache entry, keyed by user ID
 
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.ids: Dict[str, str] = {}
+        self.loaded = False
+        self.refreshed = False
 
-def add_to_playlist_from_csv(username: str, playlist_id: str, csv_name: str):
-    def _track_name(x):
-        return f"{x['name']}__{x['artists'][0]['name']}"
+    def load(self, ids: Dict[str, str]):
+        self.ids = ids
+        self.loaded = True
+
+    def index(self, playlists: Iterable[Dict]) -> Dict[str, str]:
+        # The first playlist with a given name wins, as in Spotify's own listing
+        ids: Dict[str, str] = {}
+        for p in playlists:
+            ids.setdefault(p["name"], p["id"])
+        self.load(ids)
+        self.refreshed = True
+        return ids
+
+    def needs_refresh(self, playlist_name: str) -> bool:
+        return playlist_name not in self.ids and not self.refreshed
+
+    def lookup(self, playlist_name: str) -> str:
+        if playlist_name not in self.ids:
+            raise RuntimeError(
+                f"No playlist named '{playlist_name}' for user {self.user_id}"
+            )
+        return self.ids[playlist_name]
+
+    def add(self, playlist_name: str, playlist_id: str) -> Dict[str, str]:
+        self.ids.setdefault(playlist_name, playlist_id)
+        return self.ids
+
+
+class PlaylistDirectory:
+    # PlaylistNames read through every page of the user's playlists once and
+    # kept in the metadata cache
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.names = PlaylistNames(user_id)
+
+    def _fetch(self):
+        ids = self.names.index(paginate(spotify.user_playlists(self.user_id, limit=50)))
+        cache.set(PlaylistNames.ENTITY, self.user_id, ids)
+
+    def _load(self):
+        if not self.names.loaded:
+            stored = cache.get(PlaylistNames.ENTITY, self.user_id)
+            if stored is MISSING:
+                self._fetch()
+            else:
+                self.names.load(stored)
+
+    def get(self, playlist_name: str) -> str:
+        self._load()
+        if self.names.needs_refresh(playlist_name):
+            self._fetch()
+        return self.names.lookup(playlist_name)
+
+    def add(self, playlist_name: str, playlist_id: str):
+        self._load()
+        ids = self.names.add(playlist_name, playlist_id)
+        cache.set(PlaylistNames.ENTITY, self.user_id, ids)
+
+
+_playlist_directories: Dict[str, PlaylistDirectory] = {}
+
+
+def playlist_directory(user_id: str) -> PlaylistDirectory:
+    return _playlist_directories.setdefault(user_id, PlaylistDirectory(user_id))
+
+
+def get_user_playlist_id_from_playlist_name(user_id: str, playlist_name: str) -> str:
+    return playlist_directory(user_id).get(playlist_name)
+
+
+def track_key(track_name: str, artist_name: str) -> str:
+    return f"{track_name}__{artist_name}"
+
+
+class PlaylistIndex:
+    # URI and name/artist sets for one playlist, stored in the metadata cache
+    # under the playlist's snapshot_id so an unchanged playlist is never re-read.
+    TRACK_FIELDS = "items(track(uri,name,artists(name))),next"
+
+    def __init__(self, playlist_id: str, name: str, snapshot_id: str):
+        self.playlist_id = playlist_id
+        self.name = name
+        self.snapshot_id = snapshot_id
+        self.uris: Set[str] = set()
+        self.names: Set[str] = set()
+
+    @classmethod
+    def load(cls, playlist_id: str) -> "PlaylistIndex":
+        playlist = spotify.playlist(playlist_id, fields="name,snapshot_id")
+        index = cls(playlist_id, playlist["name"], playlist["snapshot_id"])
+
+        stored = cache.get("playlist_index", index._cache_key)
+        if stored is not MISSING:
+            index.uris = set(stored["uris"])
+            index.names = set(stored["names"])
+            return index
+
+        tracks = spotify.playlist_tracks(playlist_id, fields=cls.TRACK_FIELDS)
+        for item in paginate(tracks, prefetch=True):
+            if track := item["track"]:  # local or removed tracks come back empty
+                index.uris.add(track["uri"])
+                index.names.add(track_key(track["name"], track["artists"][0]["name"]))
+        index.save()
+        return index
+
+    @property
+    def _cache_key(self) -> str:
+        return f"{self.playlist_id}:{self.snapshot_id}"
+
+    def add(self, uri: str, name: str) -> bool:
+        # False if the track (by URI or by name/artist) is already in the playlist
+        if uri in self.uris or name in self.names:
+            return False
+        self.uris.add(uri)
+        self.names.add(name)
+        return True
+
+    def save(self):
+        cache.set(
+            "playlist_index",
+            self._cache_key,
+            {"uris": sorted(self.uris), "names": sorted(self.names)},
+        )
 
-    user_id = os.getenv(username)
-    playlist_name = spotify.playlist(playlist_id)["name"]
-    existing_track_uris = [
-        x["track"]["uri"] for x in spotify.playlist_tracks(playlist_id)["items"]
-    ]
-    existing_track_names = [
-        _track_name(x["track"]) for x in spotify.playlist_tracks(playlist_id)["items"]
+
+def add_new_tracks_to_playlist(
+    playlist_id: str, tracks: Iterable[Tuple[str, str, str]]
+) -> int:
+    # tracks: (uri, track name, artist name). Anything the playlist already
+    # holds, by URI or by name/artist, is skipped. Returns how many were added.
+    index = PlaylistIndex.load(playlist_id)
+    new_track_uris = [
+        uri for uri, name, artist in tracks if index.add(uri, track_key(name, artist))
     ]
-    new_track_uris = []
+
+    if new_track_uris:
+        writer = PlaylistWriter(playlist_id, snapshot_id=index.snapshot_id)
+        writer.add(new_track_uris)
+        index.snapshot_id = writer.snapshot_id or index.snapshot_id
+        index.save()
+    logger.debug("Added %d new tracks to '%s'", len(new_track_uris), index.name)
+    return len(new_track_uris)
+
+
+def add_to_playlist_from_csv(username: str, playlist_id: str, csv_name: str):
     logger.debug(
-        "Adding to %s's playlist '%s' from '%s'", username, playlist_name, csv_name
+        "Adding to %s's playlist %s from '%s'", username, playlist_id, csv_name
     )
 
-    def _batch(seq, size):
-        return [seq[i : i + size] for i in range(0, len(seq), size)]
-
     with open(csv_name, "r") as fh:
         reader = csv.DictReader(fh)
-        for row in reader:
-            new_track_uri = row["track_uri"]
-            new_track_name = f"{row['track_name']}__{row['artist_name']}"
-            new_track_uris.append((new_track_uri, new_track_name))
-
-    for batch in _batch(new_track_uris, 10):
-        actual_new_uris = set([x[0] for x in batch]).difference(
-            set(existing_track_uris)
+        add_new_tracks_to_playlist(
+            playlist_id,
+            (
+                (row["track_uri"], row["track_name"], row["artist_name"])
+                for row in reader
+            ),
         )
-        actual_new_names = set([x[1] for x in batch]).difference(
-            set(existing_track_names)
-        )
-        if (
-            actual_new_uris
-            and actual_new_names
-            and (len(actual_new_uris) == len(actual_new_names))
-        ):
-            spotify.user_playlist_add_tracks(user_id, playlist_id, actual_new_uris)
-
     logger.debug("Finished adding from %s", csv_name)
@@ -0,0 +1,72 @@
+import time
+from typing import Callable, List, Optional, Sequence
+
+from dj.log_setup import get_logger
+from .connection import spotify
+from .util import batch
+
+logger = get_logger(__name__)
+
+PLAYLIST_WRITE_BATCH_SIZE = 100  # API maximum per add request
+WRITE_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 1.0
+
+
+class PlaylistWriter:
+    # Sends playlist writes in full 100-track chunks, in order, carrying the
+    # snapshot_id from each response into the next request that accepts one.
+    def __init__(self, playlist_id: str, snapshot_id: Optional[str] = None):
+        self.playlist_id = playlist_id
+        self.snapshot_id = snapshot_id
+        self.requests = 0
+
+    def _write(self, fn: Callable, *args, **kwargs) -> str:
+        result = fn(self.playlist_id, *args, **kwargs)
+        self.requests += 1
+        self.snapshot_id = result["snapshot_id"]
+        return self.snapshot_id
+
+    def _current_snapshot(self) -> str:
+        return spotify.playlist(self.playlist_id, fields="snapshot_id")["snapshot_id"]
+
+    def _add_chunk(self, chunk: List[str], position: Optional[int]) -> str:
+        # The only retry layer for adds (the HTTP session never retries a POST).
+        # Retries just this chunk; earlier chunks are already in place. A 5xx can
+        # come back after Spotify applied the add, so before posting again a
+        # changed snapshot_id is taken to mean it did.
+        if self.snapshot_id is None:
+            self.snapshot_id = self._current_snapshot()
+        for attempt in range(1, WRITE_ATTEMPTS):
+            try:
+                return self._write(spotify.playlist_add_items, chunk, position=position)
+            except Exception as e:
+                status = getattr(e, "http_status", None)  # spotipy.SpotifyException
+                if status is None or status < 500:
+                    raise
+                time.sleep(RETRY_DELAY_SECONDS * attempt)
+                current = self._current_snapshot()
+                if current != self.snapshot_id:
+                    logger.warning("Playlist write failed (%s) but was applied", status)
+                    self.snapshot_id = current
+                    return current
+                logger.warning(
+                    "Playlist write failed (%s); retry %d of %d",
+                    status,
+                    attempt,
+                    WRITE_ATTEMPTS - 1,
+                )
+        # Last attempt; a failure here goes to the caller
+        return self._write(spotify.playlist_add_items, chunk, position=position)
+
+    def add(self, track_uris: Sequence[str], position: Optional[int] = None):
+        for i, chunk in enumerate(batch(track_uris, PLAYLIST_WRITE_BATCH_SIZE)):
+            chunk_position = (
+                None if position is None else position + i * PLAYLIST_WRITE_BATCH_SIZE
+            )
+            self._add_chunk(list(chunk), chunk_position)
+        logger.debug(
+            "Added %d tracks to %s in %d requests",
+            len(track_uris),
+            self.playlist_id,
+            self.requests,
+        )
@@ -1,12 +1,25 @@
-from typing import Any, Dict, List
+import itertools
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from dj.log_setup import get_logger
 from dj.wrapper.connection import spotify
-from dj.wrapper.artist import build_artist
-from dj.wrapper.track import build_track, build_track_analysis
-from dj.data import TrackAnalysis, Artist
+from dj.wrapper.artist import build_artists
+from dj.wrapper.track import build_track, build_track_analyses
+from dj.data import TrackAnalysis, Artist, TrackAnalysisArtist
 
+logger = get_logger(__name__)
 
-def recommend(artist_ids: List[str], genres: List[str], track_ids: List[str], limit: int = 20):
+MAX_SEEDS = 5  # API limit per recommendations call, across all seed kinds
+MAX_RECOMMENDATIONS = 100
+DEFAULT_REQUEST_BUDGET = 20
+DEFAULT_WORKERS = 4
+
+
+def recommend(
+    artist_ids: List[str], genres: List[str], track_ids: List[str], limit: int = 20
+):
     return spotify.recommendations(
         seed_artists=artist_ids,
         seed_genres=genres,
@@ -15,16 +28,107 @@ def recommend(artist_ids: List[str], genres: List[str], track_ids: List[str], li
     )
 
 
-def build_recommended_tracklist(recs: Dict[str, Any]) -> tuple[List[TrackAnalysis], List[Artist]]:
-    artists = []
-    track_analyses = []
+def build_recommended_tracklist(
+    recs: Dict[str, Any],
+) -> Tuple[List[Optional[TrackAnalysis]], List[Optional[Artist]]]:
+    # Either side may be None for a track: no audio features, or an artist
+    # Spotify doesn't know
+    artists = build_artists([rec["artists"][0]["uri"] for rec in recs["tracks"]])
+
+    tracks = [build_track(rec) for rec in recs["tracks"]]
+    track_analyses = build_track_analyses(tracks)
+
+    return track_analyses, artists
+
+
+def seed_groups(
+    artist_ids: Optional[List[str]],
+    genres: Optional[List[str]],
+    track_ids: Optional[List[str]],
+    shuffle_seed: Optional[int] = None,
+) -> List[Dict[str, List[str]]]:
+    # Every seed in exactly one group of at most 5, kinds interleaved so groups
+    # mix artists, tracks and genres. A shuffle_seed regroups them differently.
+    kinds = [
+        [("seed_artists", a) for a in artist_ids or []],
+        [("seed_tracks", t) for t in track_ids or []],
+        [("seed_genres", g) for g in genres or []],
+    ]
+    seeds = [s for row in itertools.zip_longest(*kinds) for s in row if s]
+    if shuffle_seed is not None:
+        random.Random(shuffle_seed).shuffle(seeds)
+
+    groups = []
+    for i in range(0, len(seeds), MAX_SEEDS):
+        group: Dict[str, List[str]] = {}
+        for kind, seed in seeds[i : i + MAX_SEEDS]:
+            group.setdefault(kind, []).append(seed)
+        groups.append(group)
+    return groups
+
+
+def recommend_pool(
+    artist_ids: Optional[List[str]],
+    genres: Optional[List[str]],
+    track_ids: Optional[List[str]],
+    target: int,
+    accept: Optional[Callable[[TrackAnalysis, Artist], bool]] = None,
+    request_budget: int = DEFAULT_REQUEST_BUDGET,
+    workers: int = DEFAULT_WORKERS,
+) -> List[TrackAnalysisArtist]:
+    # Fans recommendation calls out over seed groups, round after round, until
+    # `target` distinct tracks pass `accept` or `request_budget` calls are spent.
+    # Each round regroups the seeds; a round that turns up nothing new ends it.
+    seen = set()
+    accepted: List[TrackAnalysisArtist] = []
+    requests = 0
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for round_number in itertools.count():
+            groups = seed_groups(
+                artist_ids,
+                genres,
+                track_ids,
+                shuffle_seed=round_number if round_number else None,
+            )[: request_budget - requests]
+            if not groups:
+                break
+            responses = list(
+                executor.map(
+                    lambda group: spotify.recommendations(
+                        limit=MAX_RECOMMENDATIONS, **group
+                    ),
+                    groups,
+                )
+            )
+            requests += len(groups)
 
-    for rec in recs["tracks"]:
-        artist = build_artist(rec["artists"][0]["uri"])
-        artists.append(artist)
+            fresh = []
+            for rec in itertools.chain.from_iterable(r["tracks"] for r in responses):
+                if rec["uri"] not in seen:
+                    seen.add(rec["uri"])
+                    fresh.append(rec)
+            if not fresh:
+                break
 
-        track = build_track(rec)
-        track_analysis = build_track_analysis(track)
-        track_analyses.append(track_analysis)
+            track_analyses, artists = build_recommended_tracklist({"tracks": fresh})
+            for track_analysis, artist in zip(track_analyses, artists):
+                if track_analysis and artist:
+                    if accept is None or accept(track_analysis, artist):
+                        accepted.append(
+                            TrackAnalysisArtist(
+                                track_analysis=track_analysis, artist=artist
+                            )
+                        )
+            logger.info(
+                "Round %d: %d requests, %d new tracks, %d of %d accepted",
+                round_number + 1,
+                requests,
+                len(fresh),
+                len(accepted),
+                target,
+            )
+            if len(accepted) >= target or requests >= request_budget:
+                break
 
-    return track_analyses, artists
\ No newline at end of file
+    return accepted[:target]
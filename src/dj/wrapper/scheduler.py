@@ -0,0 +1,184 @@
+import functools
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Callable, List, Mapping, Optional, Tuple
+
+from dj.log_setup import get_logger
+from .metrics import metrics
+
+logger = get_logger(__name__)
+
+# Lower runs first. Playlist writes and one-off lookups jump ahead of crawls.
+WRITE_PRIORITY = 0
+LOOKUP_PRIORITY = 1
+CRAWL_PRIORITY = 2
+
+ENDPOINT_PRIORITIES = {
+    "playlist_add_items": WRITE_PRIORITY,
+    "playlist_replace_items": WRITE_PRIORITY,
+    "playlist_reorder_items": WRITE_PRIORITY,
+    "user_playlist_add_tracks": WRITE_PRIORITY,
+    "user_playlist_create": WRITE_PRIORITY,
+    "search": LOOKUP_PRIORITY,
+    "track": LOOKUP_PRIORITY,
+    "playlist": LOOKUP_PRIORITY,
+    "recommendation_genre_seeds": LOOKUP_PRIORITY,
+}
+DEFAULT_PRIORITY = CRAWL_PRIORITY
+
+DEFAULT_RATE = 10.0  # requests per second
+DEFAULT_BURST = 20
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_MAX_RETRIES = 5
+MIN_RATE = 0.5
+BACKOFF_BASE_SECONDS = 1.0
+RATE_LIMITED = 429
+
+
+class TokenBucket:
+    # AIMD: halve the refill rate on a 429, creep back towards the ceiling on success
+    def __init__(self, rate: float, capacity: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def slow_down(self):
+        with self._lock:
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+    def speed_up(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self._in_flight = 0
+        self._waiting: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def _acquire_slot(self, priority: int):
+        ticket = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._condition.wait(pause)
+                elif (
+                    self._waiting[0] == ticket and self._in_flight < self.max_in_flight
+                ):
+                    heapq.heappop(self._waiting)
+                    self._in_flight += 1
+                    self._condition.notify_all()
+                    return
+                else:
+                    self._condition.wait()
+
+    def _release_slot(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _pause(self, seconds: float):
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def call(self, fn: Callable, *args, priority: int = DEFAULT_PRIORITY, **kwargs):
+        for attempt in itertools.count():
+            queued = time.perf_counter()
+            self._acquire_slot(priority)
+            try:
+                self.bucket.acquire()
+                metrics.record_wait(fn.__name__, time.perf_counter() - queued)
+                result = fn(*args, **kwargs)
+                self.bucket.speed_up()
+                return result
+            except Exception as e:
+                # spotipy.SpotifyException, matched by shape to keep spotipy lazy
+                status = getattr(e, "http_status", None)
+                if status != RATE_LIMITED or attempt >= self.max_retries:
+                    raise
+                delay = retry_after(getattr(e, "headers", None), attempt)
+                logger.warning(
+                    "Rate limited on %s; retrying in %.1fs", fn.__name__, delay
+                )
+                metrics.record_retry(fn.__name__)
+                self.bucket.slow_down()
+                self._pause(delay)
+            finally:
+                self._release_slot()
+
+
+def retry_after(headers: Optional[Mapping[str, Any]], attempt: int) -> float:
+    if headers and (value := headers.get("Retry-After")):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return BACKOFF_BASE_SECONDS * 2**attempt + random.uniform(0, 1)
+
+
+class ScheduledSpotify:
+    # Drop-in for spotipy.Spotify: every public method goes through the scheduler
+    def __init__(self, client, scheduler: RequestScheduler):
+        self.client = client
+        self.scheduler = scheduler
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        priority = ENDPOINT_PRIORITIES.get(name, DEFAULT_PRIORITY)
+
+        @functools.wraps(attr)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = attr(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                metrics.observe_call(name, time.perf_counter() - start, error=failed)
+
+        @functools.wraps(attr)
+        def scheduled(*args, **kwargs):
+            return self.scheduler.call(timed, *args, priority=priority, **kwargs)
+
+        return scheduled
@@ -1,9 +1,19 @@
-from typing import Any, Dict, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, List, Optional
 
 from dj.data import Artist, Album, Track, TrackAnalysis, AudioFeatures
 from dj.logging import log_track_characteristics
 from dj.log_setup import get_logger
+from dj.wrapper.cache import cache
 from dj.wrapper.connection import spotify
+from dj.wrapper.discography import discography
+from dj.wrapper.memo import single_flight
+from dj.wrapper.util import batch, id_from_uri, paginate
+
+AUDIO_FEATURES_BATCH_SIZE = 100
+TRACKS_BATCH_SIZE = 50  # API maximum for /tracks?ids=
+DEFAULT_WORKERS = 4
 
 
 logger = get_logger(__name__)
@@ -13,31 +23,129 @@ def allowable_track(allow_explicit, track):
     return allow_explicit or not track.explicit
 
 
+@single_flight(key=id_from_uri)
 def get_track_by_uri(uri: str):
     return spotify.track(uri)
 
 
-def get_all_tracks(artist: Artist, limit=None):
-    track_infos = []
-    albums = [
-        Album(id=a["id"], name=a["name"], uri=a["uri"])
-        for a in spotify.artist_albums(artist.id)["items"]
-    ]
+def get_tracks_by_uris(uris: List[str]) -> List[Optional[Dict[str, Any]]]:
+    # Raw track objects in the order given, 50 distinct IDs per request
+    unique = list(dict.fromkeys(id_from_uri(u) for u in uris))
+    found: Dict[str, Any] = {}
+    for chunk in batch(unique, TRACKS_BATCH_SIZE):
+        found.update(zip(chunk, spotify.tracks(list(chunk))["tracks"]))
+    return [found.get(id_from_uri(u)) for u in uris]
+
+
+def get_all_tracks(
+    artist: Artist, limit=None, workers: int = 1, incremental: bool = False
+):
+    return list(
+        iter_all_tracks(artist, limit=limit, workers=workers, incremental=incremental)
+    )
+
+
+def iter_all_tracks(
+    artist: Artist, limit=None, workers: int = 1, incremental: bool = False
+) -> Iterator[TrackAnalysis]:
+    # incremental: always re-list the artist's albums, but read albums we have
+    # crawled before from the discography store instead of the API
+    if incremental:
+        albums = [Album(**a) for a in refresh_artist_albums(artist.id)]
+    else:
+        albums = [Album(**a) for a in get_artist_albums(artist.id)]
 
     if limit:
         album_list = albums[0:limit]
     else:
         album_list = albums
 
-    for album in album_list:
-        logger.debug("Collecting tracks from %s", album.name)
-        for track_ in spotify.album_tracks(album.uri)["items"]:
-            track = build_track(track_)
-            track_analysis = build_track_analysis(track)
-            if track_analysis:  # Deal with returned Nonetypes from Spotify
-                track_infos.append(track_analysis)
+    if incremental:
+        known = discography.known_album_ids(artist.id)
+        new_albums = sum(1 for a in album_list if a.id not in known)
+        logger.info("%s: %d new of %d albums", artist.name, new_albums, len(album_list))
+
+        def analyses_for(album: Album) -> List[Optional[TrackAnalysis]]:
+            return sync_album_track_analyses(artist.id, album, album.id in known)
+
+    else:
+        analyses_for = get_album_track_analyses
+
+    # At most `workers` albums are fetched ahead of the consumer, and they are
+    # yielded in album order, so output matches the serial crawl
+    workers = max(workers, 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: Deque = deque()
+        for album in album_list:
+            pending.append(executor.submit(analyses_for, album))
+            if len(pending) > workers:
+                yield from _present(pending.popleft().result())
+        while pending:
+            yield from _present(pending.popleft().result())
+
+
+def _present(analyses: List[Optional[TrackAnalysis]]) -> Iterator[TrackAnalysis]:
+    for track_analysis in analyses:
+        if track_analysis:  # Deal with returned Nonetypes from Spotify
+            yield track_analysis
+
+
+def get_album_track_analyses(album: Album) -> List[Optional[TrackAnalysis]]:
+    logger.debug("Collecting tracks from %s", album.name)
+    tracks = [build_track(t) for t in get_album_tracks(album.uri)]
+    return build_track_analyses(tracks)
+
+
+def sync_album_track_analyses(
+    artist_id: str, album: Album, known: bool
+) -> List[Optional[TrackAnalysis]]:
+    if not known:
+        tracks = [build_track(t) for t in get_album_tracks(album.uri)]
+        analyses = build_track_analyses(tracks)
+        discography.save_album(artist_id, album, tracks, analyses)
+        return analyses
+
+    analyses = discography.album_track_analyses(album.id)
+    # Tracks Spotify had no features for when the album was stored get one
+    # more try on a later sync, then are left alone
+    if missing := discography.missing_feature_tracks(album.id):
+        found = [ta for ta in build_track_analyses(missing) if ta]
+        discography.update_features(found)
+        discography.record_feature_attempt(missing)
+        if found:
+            analyses = discography.album_track_analyses(album.id)
+    return analyses
+
+
+def _fetch_artist_albums(artist_id: str) -> List[Dict[str, Any]]:
+    return [
+        {"id": a["id"], "name": a["name"], "uri": a["uri"]}
+        for a in paginate(spotify.artist_albums(artist_id, limit=50))
+    ]
+
+
+def get_artist_albums(artist_id: str) -> List[Dict[str, Any]]:
+    return cache.cached(
+        "artist_albums", artist_id, lambda: _fetch_artist_albums(artist_id)
+    )
+
+
+def refresh_artist_albums(artist_id: str) -> List[Dict[str, Any]]:
+    # Bypasses the cached listing, which could hide a release from today
+    albums = _fetch_artist_albums(artist_id)
+    cache.set("artist_albums", artist_id, albums)
+    return albums
+
 
-    return track_infos
+def get_album_tracks(album_uri: str) -> List[Dict[str, Any]]:
+    return cache.cached(
+        "album_tracks",
+        album_uri,
+        lambda: [
+            {"name": t["name"], "uri": t["uri"], "explicit": t["explicit"]}
+            for t in paginate(spotify.album_tracks(album_uri, limit=50))
+        ],
+    )
 
 
 def build_track(raw_track_info: Dict[str, Any]) -> Track:
@@ -48,21 +156,43 @@ def build_track(raw_track_info: Dict[str, Any]) -> Track:
     )
 
 
-def build_track_analysis(track: Track) -> TrackAnalysis:
-    if features := spotify.audio_features(track.uri):
-        if features[0]:  # sometimes Spotify returns None
-            analysis = AudioFeatures(**features[0])
-            return TrackAnalysis(track=track, analysis=analysis)
+def build_track_analysis(track: Track) -> Optional[TrackAnalysis]:
+    return build_track_analyses([track])[0]
+
+
+def build_track_analyses(tracks: List[Track]) -> List[Optional[TrackAnalysis]]:
+    # One request per 100 uncached URIs. Order matches `tracks`; missing -> None
+    uris = [t.uri for t in tracks]
+    features = cache.get_many("audio_features", uris)
+    missing = list(dict.fromkeys(u for u in uris if u not in features))
+
+    for chunk in batch(missing, AUDIO_FEATURES_BATCH_SIZE):
+        fetched = spotify.audio_features(list(chunk)) or []
+        fetched += [None] * (len(chunk) - len(fetched))
+        fetched_by_uri = dict(zip(chunk, fetched))
+        # sometimes Spotify returns None; don't cache those, they may show up later
+        cache.set_many("audio_features", {u: f for u, f in fetched_by_uri.items() if f})
+        features.update(fetched_by_uri)
+
+    analyses: List[Optional[TrackAnalysis]] = []
+    for track in tracks:
+        if feature := features.get(track.uri):
+            analyses.append(
+                TrackAnalysis(track=track, analysis=AudioFeatures(**feature))
+            )
+        else:
+            analyses.append(None)
+
+    return analyses
 
 
 def build_preliminary_tracklist(
     spotify_tracks: List[Dict[str, Any]], allow_explicit=False
-) -> List[TrackAnalysis]:
+) -> List[Optional[TrackAnalysis]]:
     analyses = []
 
-    for t in spotify_tracks:
-        track = build_track(t)
-        track_analysis = build_track_analysis(track)
+    tracks = [build_track(t) for t in spotify_tracks]
+    for track, track_analysis in zip(tracks, build_track_analyses(tracks)):
         logger.debug("'%s'", track.name)
         logger.debug("---- URI: %s", track.uri)
         analyses.append(track_analysis)
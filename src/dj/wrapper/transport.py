@@ -0,0 +1,126 @@
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Optional, Sequence
+
+from dj.log_setup import get_logger
+from .scheduler import DEFAULT_MAX_IN_FLIGHT
+
+logger = get_logger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 5.0  # seconds
+DEFAULT_READ_TIMEOUT = 15.0
+DEFAULT_HTTP_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.3
+# Methods a 5xx may be retried for. Not POST: a playlist add that 5xxed may have
+# been applied already.
+RETRYABLE_METHODS = frozenset(["GET", "PUT", "DELETE"])
+
+
+class TransportSettings:
+    # One knob for concurrency: pool_size is both the number of kept-alive
+    # connections and the scheduler's in-flight cap, so a request never waits
+    # on the pool or opens a connection outside it.
+    def __init__(self, pool_size: int, connect_timeout: float, read_timeout: float):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+
+_overrides: Dict[str, Any] = {}
+_settings: Optional[TransportSettings] = None
+_settings_lock = threading.Lock()
+
+
+def configure_transport(
+    pool_size: Optional[int] = None,
+    connect_timeout: Optional[float] = None,
+    read_timeout: Optional[float] = None,
+):
+    # Overrides the DJ_* environment; only before the first API call
+    with _settings_lock:
+        if _settings is not None:
+            raise RuntimeError("configure_transport() called after the client exists")
+        if pool_size is not None:
+            _overrides["pool_size"] = max(int(pool_size), 1)
+        if connect_timeout is not None:
+            _overrides["connect_timeout"] = float(connect_timeout)
+        if read_timeout is not None:
+            _overrides["read_timeout"] = float(read_timeout)
+
+
+def ensure_pool_size(workers: int):
+    # Grow (never shrink) the pool to cover a CLI's worker threads
+    with _settings_lock:
+        if _settings is not None:
+            return
+        current = _overrides.get(
+            "pool_size", int(os.getenv("DJ_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT))
+        )
+        _overrides["pool_size"] = max(current, workers)
+
+
+def transport_settings() -> TransportSettings:
+    # Resolved once, when the client is built (after .env is loaded)
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = TransportSettings(
+                pool_size=_overrides.get(
+                    "pool_size",
+                    int(os.getenv("DJ_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)),
+                ),
+                connect_timeout=_overrides.get(
+                    "connect_timeout",
+                    float(os.getenv("DJ_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+                ),
+                read_timeout=_overrides.get(
+                    "read_timeout",
+                    float(os.getenv("DJ_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)),
+                ),
+            )
+        return _settings
+
+
+def build_session(settings: TransportSettings, status_forcelist: Sequence[int]):
+    # requests/urllib3 are only imported once the first API call needs them
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    # Spotify sets no cookies we need; refusing them leaves the session with no
+    # per-request mutable state, so all threads can share it and its pool
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    session.headers.update({"Accept-Encoding": "gzip", "Connection": "keep-alive"})
+    adapter = HTTPAdapter(
+        pool_connections=1,  # one host
+        pool_maxsize=settings.pool_size,
+        pool_block=True,  # wait for a warm connection instead of a throwaway one
+        max_retries=Retry(
+            total=DEFAULT_HTTP_RETRIES,
+            connect=None,
+            read=False,
+            allowed_methods=RETRYABLE_METHODS,
+            status=DEFAULT_HTTP_RETRIES,
+            backoff_factor=DEFAULT_BACKOFF_FACTOR,
+            status_forcelist=status_forcelist,
+            # Otherwise urllib3 retries any 429 with a Retry-After header itself,
+            # sleeping while it holds a connection and a scheduler slot
+            respect_retry_after_header=False,
+            # Out of retries, hand the last 5xx to spotipy instead of raising
+            # RetryError, which spotipy reports as a 429 and the scheduler
+            # would take for rate limiting
+            raise_on_status=False,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    logger.debug(
+        "HTTP pool of %d connections, timeouts %s", settings.pool_size, settings.timeout
+    )
+    return session
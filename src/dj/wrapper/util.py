@@ -1,5 +1,52 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TypeVar
+
 from dj.wrapper.connection import spotify
 
+T = TypeVar("T")
+
+SPOTIFY_ID = re.compile(r"[0-9A-Za-z]{22}")
+
+
+def batch(seq: Sequence[T], size: int) -> List[Sequence[T]]:
+    return [seq[i : i + size] for i in range(0, len(seq), size)]
+
+
+def id_from_uri(uri: str) -> str:
+    # Accepts "spotify:artist:<id>", "https://open.spotify.com/artist/<id>?si=..."
+    # or a bare ID
+    if uri.startswith("spotify:"):
+        return uri.split(":")[-1]
+    if uri.startswith("http"):
+        return uri.split("?")[0].rstrip("/").split("/")[-1]
+    return uri
+
+
+def is_spotify_reference(value: str, type_: str) -> bool:
+    # A URI, open.spotify.com URL or bare base-62 ID, as opposed to a name
+    if value.startswith(f"spotify:{type_}:"):
+        return True
+    if value.startswith("http"):
+        return f"/{type_}/" in value
+    return bool(SPOTIFY_ID.fullmatch(value))
+
+
+def paginate(page: Optional[Dict[str, Any]], prefetch=False) -> Iterator[Any]:
+    # Follows `next` links lazily; with prefetch the following page is requested
+    # in the background while the caller works through the current one.
+    if not prefetch:
+        while page:
+            yield from page["items"]
+            page = spotify.next(page) if page.get("next") else None
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        while page:
+            upcoming = executor.submit(spotify.next, page) if page.get("next") else None
+            yield from page["items"]
+            page = upcoming.result() if upcoming else None
+
 
 def search(query: str, type_: str):
     s = spotify.search(query, type=type_, limit=1)